@@ -14,7 +14,8 @@ from apscheduler.triggers.interval import IntervalTrigger
 from pkg.plugin.context import register, handler, BasePlugin, APIHost, EventContext
 from pkg.plugin.events import PersonNormalMessageReceived
 
-from .src.booker import VenueBooker
+from .src.booker import VenueBooker, parse_check_args
+from .src.worker import PRECHECK_TIMEOUT, run_booking_in_worker
 
 
 @register(name="SzuVenueBooker", description="深大体育场馆自动抢票助手", version="1.1", author="SzuHelper")
@@ -77,6 +78,8 @@ class SzuVenueBookerPlugin(BasePlugin):
 
     # 定义在线程中运行的函数
     def run_check():
+      # 预解析并测速 ehall/authserver，后续连接固定到最快的地址
+      self.booker.prewarm()
       # force_check=True 会调用 API 测试 Cookie，如果失效则自动启动浏览器续期
       # 返回值: (bool:是否成功, str:错误信息或None)
       return self.booker.reload_config(force_check=True)
@@ -105,6 +108,14 @@ class SzuVenueBookerPlugin(BasePlugin):
       else:
         self.logger.warning(f"未配置 admin_qq，无法发送通知: {msg}")
 
+    # 独立进程模式：抢票不受宿主事件循环/GIL 上其它插件的干扰
+    if self.booker.config.get("isolated_worker", False):
+      # 抢票时长之外留出赛前检查 (可能包含浏览器续期) 的时间，超时强制结束子进程
+      timeout = self.booker.config.get("max_duration_minutes", 6) * 60 + PRECHECK_TIMEOUT
+      if await run_booking_in_worker(self.config_path, send_notify, timeout=timeout):
+        return
+      self.logger.warning("抢票子进程启动失败，回退到进程内抢票")
+
     # 执行抢票逻辑
     await self.booker.run_booking_cycle(send_notify)
 
@@ -142,8 +153,10 @@ class SzuVenueBookerPlugin(BasePlugin):
         "🏸 **深大场馆助手指令**\n"
         "#venue config : 重载配置并检查Cookie\n"
         "#venue list : 列出场馆/项目\n"
-        "#venue check : 检查明天场地情况\n"
+        "#venue check : 并发检查所有目标明天的场地情况\n"
+        "#venue check 002 1 [+1|MM-DD] [19:00-22:00] [1.0] : 按项目/校区/日期/时段查询\n"
         "#venue refresh : 手动强制刷新一次Cookie\n"
+        "#venue stats : 查看网络状态(固定的连接地址)\n"
         "#venue run : 立即触发抢票"
       )
       ctx.add_return("reply", [reply])
@@ -166,12 +179,22 @@ class SzuVenueBookerPlugin(BasePlugin):
       ctx.add_return("reply", [res])
       ctx.prevent_default()
 
-    elif msg == "#venue check":
+    elif msg == "#venue check" or msg.startswith("#venue check "):
+      try:
+        query = parse_check_args(msg.split()[2:])
+      except ValueError as e:
+        ctx.add_return("reply", [f"❌ 参数错误: {e}"])
+        ctx.prevent_default()
+        return
       ctx.add_return("reply", ["🔍 正在获取场地信息..."])
-      res = await asyncio.to_thread(self.booker.test_room_list)
+      res = await self.booker.check_availability(query)
       await self.send_private_msg(sender, res)
       ctx.prevent_default()
 
+    elif msg == "#venue stats":
+      ctx.add_return("reply", [self.booker.format_stats()])
+      ctx.prevent_default()
+
     elif msg == "#venue run":
       ctx.add_return("reply", ["🚀 手动触发抢票任务！"])
       asyncio.create_task(self.scheduled_booking_task())
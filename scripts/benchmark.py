@@ -0,0 +1,516 @@
+# scripts/benchmark.py
+# -*- coding: utf-8 -*-
+"""
+性能基准工具
+
+用法:
+  python scripts/benchmark.py startup [-n 5]   插件加载耗时与常驻内存 (懒加载 vs 预先导入登录后端)
+  python scripts/benchmark.py transport        HTTP/1.1 连接池 vs HTTP/2 多路复用：握手开销与并发请求到达时间差
+  python scripts/benchmark.py login            Selenium 续期耗时 (本地替身登录页，需要 Chrome)
+  python scripts/benchmark.py jitter           宿主负载下的请求发送抖动：进程内 vs 独立抢票进程
+  python scripts/benchmark.py resolver         域名固定检查：替身解析器/测速函数驱动 HostResolver，验证固定、切换与回退
+  python scripts/benchmark.py cluster          多个抢票进程同时抢：各自为战 vs 共享租约协同 (含节点中途掉线)
+"""
+import argparse
+import asyncio
+import http.server
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+sys.path.append(current_dir)
+
+# 在独立子进程中执行，避免本进程已导入的模块干扰测量
+_STARTUP_PROBE = r'''
+import json, os, sys, time
+sys.path.insert(0, sys.argv[1])
+
+def rss_kb():
+  try:
+    with open("/proc/self/statm") as f:
+      return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+  except (OSError, ValueError):
+    pass
+  try:
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  except ImportError:
+    return 0
+
+mode = sys.argv[2]
+rss0 = rss_kb()
+t0 = time.perf_counter()
+
+from src.booker import VenueBooker, load_login_backend
+booker = VenueBooker(os.path.join(sys.argv[1], "config.json"))
+error = None
+if mode == "eager":
+  # 旧版行为: 插件加载时就导入 selenium 登录模块
+  try:
+    import src.login
+  except ImportError as e:
+    error = str(e)
+elif mode == "first_login":
+  # 懒加载模式下第一次续期时才付出的代价
+  if load_login_backend() is None:
+    error = "登录后端依赖缺失"
+
+elapsed = (time.perf_counter() - t0) * 1000
+heavy = [m for m in ("requests", "selenium", "webdriver_manager") if m in sys.modules]
+print(json.dumps({"ms": elapsed, "rss_kb": rss_kb() - rss0, "heavy": heavy, "error": error}))
+'''
+
+
+def run_startup_probe(mode):
+  out = subprocess.run(
+    [sys.executable, "-c", _STARTUP_PROBE, project_root, mode],
+    capture_output=True, text=True, check=True
+  ).stdout
+  return json.loads(out.strip().splitlines()[-1])
+
+
+def bench_startup(args):
+  print(f"📦 插件加载基准 (每种模式 {args.n} 次，取中位数)\n")
+  print(f"{'模式':<14}{'耗时(ms)':>10}{'RSS增量(MB)':>14}  已加载的重依赖")
+  for mode, title in (("lazy", "懒加载(当前)"), ("eager", "预先导入登录"), ("first_login", "首次续期")):
+    runs = [run_startup_probe(mode) for _ in range(args.n)]
+    ms = statistics.median(r["ms"] for r in runs)
+    rss = statistics.median(r["rss_kb"] for r in runs) / 1024
+    last = runs[-1]
+    note = ", ".join(last["heavy"]) or "-"
+    if last["error"]:
+      note += f"  (⚠️ {last['error']})"
+    print(f"{title:<12}{ms:>10.1f}{rss:>14.1f}  {note}")
+
+
+def fire_concurrently(api, n, date):
+  """n 个线程在同一时刻同时提交预约，返回各线程的发出时刻"""
+  barrier = threading.Barrier(n)
+  fired = [0.0] * n
+
+  def worker(i):
+    barrier.wait()
+    fired[i] = time.perf_counter()
+    api.post_book("008", f"002-{i + 1}", "002", "1", "19:00-20:00", date, "1.0")
+
+  threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+  for t in threads:
+    t.start()
+  for t in threads:
+    t.join()
+  return fired
+
+
+def bench_transport(args):
+  from mock_ehall import MockEhall, generate_self_signed, make_ssl_context, start_in_thread
+  from src.api import SzuApi, create_session, describe_transport
+
+  cert, key = generate_self_signed()
+  mock = MockEhall(rooms=args.concurrency, delay_ms=args.delay_ms)
+  base_url, stop = start_in_thread(mock, ssl_context=make_ssl_context(cert, key, h2=True))
+  print(f"🏟️ 本地 TLS 替身: {base_url} (处理延迟 {args.delay_ms}ms, 并发 {args.concurrency}, {args.rounds} 轮)\n")
+
+  try:
+    for transport in ("http1", "http2"):
+      session = create_session(pool_size=args.concurrency, transport=transport, verify=cert)
+      api = SzuApi("JSESSIONID=bench", "2020000000", "测试", session=session, base_url=base_url)
+
+      # 握手开销: 冷启动第一次请求 - 连接复用后的请求
+      mock.reset()
+      t0 = time.perf_counter()
+      api.get_sys_config()
+      cold = (time.perf_counter() - t0) * 1000
+      warm = []
+      for _ in range(5):
+        t0 = time.perf_counter()
+        api.get_sys_config()
+        warm.append((time.perf_counter() - t0) * 1000)
+      handshake = cold - statistics.median(warm)
+
+      # 并发提交: 服务端收到请求的时间差 (最晚 - 最早)
+      spreads, lags, new_conns = [], [], 0
+      for r in range(args.rounds):
+        mock.reset()
+        fired = fire_concurrently(api, args.concurrency, f"2099-01-{r + 1:02d}")
+        arrivals = [t for name, t in mock.arrivals if name == "insertVenueBookingInfo.do"]
+        spreads.append((max(arrivals) - min(arrivals)) * 1000)
+        lags.append((max(arrivals) - min(fired)) * 1000)
+        new_conns += mock.connections
+
+      desc = describe_transport(session)
+      print(f"[{transport}] 实际协议: {desc['negotiated']}")
+      print(f"  握手开销: {handshake:.1f}ms (首个请求 {cold:.1f}ms, 复用 {statistics.median(warm):.1f}ms)")
+      print(f"  到达时间差: 中位 {statistics.median(spreads):.1f}ms / 最大 {max(spreads):.1f}ms")
+      print(f"  发出到全部到达: 中位 {statistics.median(lags):.1f}ms")
+      print(f"  并发提交期间新建连接: {new_conns} 条\n")
+      session.close()
+  finally:
+    stop()
+
+
+_STUB_LOGIN_PAGE = b"""<!DOCTYPE html><html><head><title>CAS</title>
+<link rel="stylesheet" href="/static/slow.css"><link rel="icon" href="/static/favicon.ico">
+</head><body><img src="/static/banner.png"><img src="/static/bg.jpg">
+<form method="post" action="/authserver/login">
+<input id="username" name="username"><input id="password" name="password" type="password">
+<input id="rememberMe" name="rememberMe" type="checkbox">
+<button id="login_submit" type="submit">login</button>
+</form></body></html>"""
+
+
+class StubLoginHandler(http.server.BaseHTTPRequestHandler):
+  """模拟 ehall -> authserver -> ehall 的 CAS 跳转；静态资源故意很慢，用来体现资源拦截的效果"""
+
+  resource_delay = 0.5
+  submit_delay = 0.1
+
+  def log_message(self, *args):
+    pass
+
+  def _redirect(self, location, cookie=None):
+    self.send_response(302)
+    self.send_header("Location", location)
+    if cookie:
+      self.send_header("Set-Cookie", cookie)
+    self.send_header("Content-Length", "0")
+    self.end_headers()
+
+  def _html(self, body):
+    self.send_response(200)
+    self.send_header("Content-Type", "text/html; charset=utf-8")
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def do_GET(self):
+    if self.path.startswith("/static/"):
+      time.sleep(self.resource_delay)
+      self.send_response(200)
+      self.send_header("Content-Length", "0")
+      self.end_headers()
+    elif self.path.startswith("/authserver/login"):
+      self._html(_STUB_LOGIN_PAGE)
+    elif "MOD_AUTH_CAS=" in (self.headers.get("Cookie") or ""):
+      self._html(b"<html><body>ehall</body></html>")
+    else:
+      self._redirect("/authserver/login?service=index.do")
+
+  def do_POST(self):
+    self.rfile.read(int(self.headers.get("Content-Length", 0)))
+    time.sleep(self.submit_delay)
+    self._redirect("/qljfwapp/sys/lwSzuCgyy/index.do", cookie="MOD_AUTH_CAS=stub; Path=/")
+
+
+def bench_login(args):
+  from src.login import get_new_cookie
+
+  server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubLoginHandler)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  target = f"http://127.0.0.1:{server.server_port}/qljfwapp/sys/lwSzuCgyy/index.do"
+  print(f"🔐 本地替身登录页: {target} (静态资源延迟 {StubLoginHandler.resource_delay * 1000:.0f}ms)\n")
+
+  try:
+    for block in (True, False):
+      times = []
+      for _ in range(args.n):
+        # 每次用全新的 Profile，保证走完整的登录流程
+        with tempfile.TemporaryDirectory(prefix="bench_profile_") as profile:
+          t0 = time.perf_counter()
+          code, result = get_new_cookie("2020000000", "pwd", headless=True, target_url=target,
+                                        block_resources=block, user_data_dir=profile)
+          times.append(time.perf_counter() - t0)
+        if code != "SUCCESS":
+          print(f"❌ 登录失败: {code} - {result}")
+          return
+      title = "拦截资源" if block else "不拦截资源"
+      print(f"{title}: 中位 {statistics.median(times):.2f}s / 最快 {min(times):.2f}s / 最慢 {max(times):.2f}s")
+  finally:
+    server.shutdown()
+
+
+def _free_port():
+  with socket.socket() as sock:
+    sock.bind(("127.0.0.1", 0))
+    return sock.getsockname()[1]
+
+
+def _start_mock_process(port, *extra):
+  """在独立进程中启动 mock ehall，避免与被测进程争用 GIL"""
+  proc = subprocess.Popen(
+    [sys.executable, os.path.join(current_dir, "mock_ehall.py"), "--port", str(port), *extra],
+    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+  )
+  for _ in range(100):
+    try:
+      socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+      return proc
+    except OSError:
+      time.sleep(0.05)
+  proc.kill()
+  raise RuntimeError("mock ehall 启动失败")
+
+
+def _fetch_arrivals(base_url):
+  import requests
+  return requests.post(f"{base_url}/__arrivals", timeout=5).json()
+
+
+def _write_bench_config(path, base_url, delay_ms, seconds, targets=1, **extra):
+  config = {
+    "admin_qq": "", "stuid": "2020000000", "stuname": "测试", "password": "",
+    "cookie": "JSESSIONID=bench", "base_url": base_url,
+    "request_delay_ms": delay_ms, "max_duration_minutes": seconds / 60,
+    "targets": [
+      {"comment": f"bench-{i}", "CGDM": "008", "XMDM": "002", "XQWID": "1",
+       "KYYSJD": f"{h:02d}:00-{h + 1:02d}:00", "YYLX": "1.0", "priority": 1}
+      # 从 19:00 开始，超出 21:00 后回到 08:00 (mock 的时段范围)
+      for i, h in ((i, 8 + (11 + i) % 14) for i in range(targets))
+    ],
+  }
+  config.update(extra)
+  with open(path, "w", encoding="utf-8") as f:
+    json.dump(config, f, ensure_ascii=False)
+
+
+async def _host_load(stop, block_ms):
+  """模拟宿主上其它插件的慢处理器：不定期同步阻塞事件循环"""
+  while not stop.is_set():
+    time.sleep(random.uniform(0, block_ms) / 1000)
+    await asyncio.sleep(random.uniform(0, 0.02))
+
+
+def _gil_hog(stop):
+  """模拟宿主上的 CPU 密集线程，争用 GIL"""
+  while not stop.is_set():
+    sum(i * i for i in range(10000))
+
+
+async def _run_under_load(run, args):
+  stop, tstop = asyncio.Event(), threading.Event()
+  tasks = [asyncio.create_task(_host_load(stop, args.block_ms)) for _ in range(args.load_tasks)]
+  threads = [threading.Thread(target=_gil_hog, args=(tstop,), daemon=True) for _ in range(args.load_threads)]
+  for t in threads:
+    t.start()
+  try:
+    await run()
+  finally:
+    stop.set()
+    tstop.set()
+    await asyncio.gather(*tasks)
+
+
+def bench_jitter(args):
+  from src.booker import VenueBooker
+  from src.worker import run_booking_in_worker
+
+  port = _free_port()
+  mock = _start_mock_process(port, "--rooms", "0")
+  base_url = f"http://127.0.0.1:{port}"
+  print(f"🏟️ mock ehall 进程: {base_url} (无空场，抢票循环只会持续查询)")
+  print(f"宿主负载: {args.load_tasks} 个阻塞协程 (每次最多 {args.block_ms}ms) + {args.load_threads} 个 CPU 线程")
+  print(f"请求间隔 {args.delay_ms}ms，每种模式运行 {args.seconds}s\n")
+
+  async def quiet(msg):
+    pass
+
+  try:
+    with tempfile.TemporaryDirectory(prefix="bench_jitter_") as tmp:
+      config_path = os.path.join(tmp, "config.json")
+      _write_bench_config(config_path, base_url, args.delay_ms, args.seconds)
+
+      modes = (
+        ("进程内", lambda: VenueBooker(config_path).run_booking_cycle(quiet)),
+        ("独立进程", lambda: run_booking_in_worker(config_path, quiet, timeout=args.seconds + 60)),
+      )
+      for title, run in modes:
+        _fetch_arrivals(base_url)
+        asyncio.run(_run_under_load(run, args))
+        times = [t for name, t in _fetch_arrivals(base_url) if name == "getOpeningRoom.do"]
+        gaps = sorted((b - a) * 1000 for a, b in zip(times, times[1:]))
+        if len(gaps) < 2:
+          print(f"{title}: 请求数不足，无法统计")
+          continue
+        p50 = statistics.median(gaps)
+        p99 = gaps[min(len(gaps) - 1, int(len(gaps) * 0.99))]
+        print(f"{title}: 请求 {len(times)} 次, 发送间隔 中位 {p50:.1f}ms / p99 {p99:.1f}ms / 最大 {gaps[-1]:.1f}ms, "
+              f"抖动(标准差) {statistics.pstdev(gaps):.1f}ms")
+  finally:
+    mock.terminate()
+    mock.wait()
+
+
+def bench_resolver(args):
+  from src.api import create_session
+  from src.net import HostResolver
+
+  port = _free_port()
+  mock = _start_mock_process(port)
+  # 系统 DNS 解析不了的域名：请求能成功只可能是走了固定地址
+  host = "ehall.mock.test"
+  url = f"http://{host}:{port}/qljfwapp/sys/lwSzuCgyy/sportVenue/getSportVenueData.do"
+  # 替身解析器：127.0.0.2 上没有监听；answers 为 None 时模拟 DNS 故障
+  dns = {"answers": ["127.0.0.2", "127.0.0.1"]}
+
+  def stub_resolve(h, p):
+    if dns["answers"] is None:
+      raise OSError("stub DNS unavailable")
+    return dns["answers"]
+
+  def stub_probe(ip, p, timeout):
+    # 故意让不可达的地址测速最快，逼出建连失败后的切换
+    return {"127.0.0.2": 1.0, "127.0.0.1": args.rtt_ms}.get(ip)
+
+  resolver = HostResolver(stub_resolve, stub_probe, port=port)
+  session = create_session(resolver=resolver)
+  results = []
+
+  def check(name, ok):
+    results.append(ok)
+    print(f"{'✅' if ok else '❌'} {name}")
+
+  try:
+    check("预热后固定到测速最快的地址", resolver.warm([host])[host] == "127.0.0.2")
+
+    start = time.perf_counter()
+    ok = session.post(url, timeout=5).status_code == 200
+    cost = (time.perf_counter() - start) * 1000
+    check(f"固定地址连不上时切换到下一个地址 ({cost:.1f}ms)", ok and resolver.pick(host) == "127.0.0.1")
+
+    session.close()
+    session = create_session(resolver=resolver)
+    ok = session.post(url, timeout=5).status_code == 200
+    check("新连接直接使用切换后的地址", ok and resolver.snapshot()[host]["failed"] == 1)
+
+    dns["answers"] = None
+    check("解析失败时保留原来的固定地址", resolver.warm([host])[host] == "127.0.0.1")
+
+    dns["answers"] = ["127.0.0.3"]
+    check("全部地址不可达时回退系统解析", resolver.warm([host])[host] is None and resolver.pinned() == {})
+  finally:
+    session.close()
+    mock.terminate()
+    mock.wait()
+
+  print(f"\n{sum(results)}/{len(results)} 项通过")
+  if not all(results):
+    sys.exit(1)
+
+
+def _fetch_bookings(base_url):
+  import requests
+  return requests.post(f"{base_url}/__bookings", timeout=5).json()
+
+
+def bench_cluster(args):
+  port = _free_port()
+  base_url = f"http://127.0.0.1:{port}"
+  print(f"{args.nodes} 个抢票进程 (不同账号)，{args.targets} 个目标，每个时段 {args.rooms} 个场地")
+  print(f"场地在启动 {args.open_after}s 后放出，节点 0 在放票前 1s 被强制结束\n")
+
+  for coordinated in (False, True):
+    title = "共享租约协同" if coordinated else "各自为战"
+    mock = _start_mock_process(
+      port, "--rooms", str(args.rooms), "--open-after", str(args.open_after), "--delay-ms", str(args.server_delay_ms)
+    )
+    started = time.monotonic()
+    procs = []
+    try:
+      with tempfile.TemporaryDirectory(prefix="bench_cluster_") as tmp:
+        for i in range(args.nodes):
+          extra = {"stuid": f"20200000{i:02d}"}
+          if coordinated:
+            extra["coordination"] = {
+              "store": "sqlite:///" + os.path.join(tmp, "lease.db"), "node_id": f"node-{i}", "ttl_seconds": args.ttl
+            }
+          config_path = os.path.join(tmp, f"config-{i}.json")
+          _write_bench_config(config_path, base_url, args.delay_ms, args.open_after + args.seconds, args.targets, **extra)
+          procs.append(subprocess.Popen(
+            [sys.executable, "-m", "src.worker", config_path],
+            cwd=project_root, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+          ))
+
+        time.sleep(max(args.open_after - 1 - (time.monotonic() - started), 0))
+        procs[0].kill()
+        for proc in procs:
+          proc.wait()
+
+      bookings = _fetch_bookings(base_url)
+      submits = sum(1 for name, _ in _fetch_arrivals(base_url) if name == "insertVenueBookingInfo.do")
+    finally:
+      for proc in procs:
+        if proc.poll() is None:
+          proc.kill()
+      mock.terminate()
+      mock.wait()
+
+    per_target = {}
+    for b in bookings:
+      per_target.setdefault(b["KYYSJD"], []).append(b)
+    print(f"[{title}] 预约请求 {submits} 次，成功预约 {len(bookings)} 个场地 (目标 {args.targets} 个)")
+    for slot in sorted(per_target):
+      rows = sorted(per_target[slot], key=lambda b: b["after_open"])
+      detail = ", ".join(f"{b['CDWID']} by {b['YYRGH'][-2:]} @{b['after_open']:.2f}s" for b in rows)
+      print(f"  {slot}: {len(rows)} 个 ({detail})")
+    missed = args.targets - len(per_target)
+    if missed:
+      print(f"  ⚠️ {missed} 个目标未约到")
+    print()
+
+
+def main():
+  parser = argparse.ArgumentParser(description="SzuVenueBooker 性能基准")
+  sub = parser.add_subparsers(dest="cmd", required=True)
+
+  p = sub.add_parser("startup", help="插件加载耗时与常驻内存")
+  p.add_argument("-n", type=int, default=5, help="每种模式的重复次数")
+  p.set_defaults(func=bench_startup)
+
+  p = sub.add_parser("transport", help="HTTP/1.1 与 HTTP/2 的握手开销和并发到达时间差")
+  p.add_argument("-c", "--concurrency", type=int, default=16, help="同时提交的预约请求数")
+  p.add_argument("-r", "--rounds", type=int, default=10, help="重复轮数")
+  p.add_argument("--delay-ms", type=float, default=20, help="替身服务器处理延迟")
+  p.set_defaults(func=bench_transport)
+
+  p = sub.add_parser("login", help="Selenium 续期耗时")
+  p.add_argument("-n", type=int, default=3, help="每种模式的重复次数")
+  p.set_defaults(func=bench_login)
+
+  p = sub.add_parser("jitter", help="宿主负载下进程内/独立进程的发送抖动")
+  p.add_argument("--seconds", type=float, default=10, help="每种模式的运行时长")
+  p.add_argument("--delay-ms", type=int, default=50, help="抢票请求间隔 (request_delay_ms)")
+  p.add_argument("--load-tasks", type=int, default=4, help="阻塞事件循环的协程数")
+  p.add_argument("--block-ms", type=float, default=30, help="单次阻塞的最长时间")
+  p.add_argument("--load-threads", type=int, default=2, help="争用 GIL 的线程数")
+  p.set_defaults(func=bench_jitter)
+
+  p = sub.add_parser("resolver", help="用替身解析器检查域名固定/切换/回退")
+  p.add_argument("--rtt-ms", type=float, default=5, help="替身测速给可用地址的延迟")
+  p.set_defaults(func=bench_resolver)
+
+  p = sub.add_parser("cluster", help="多进程抢票：各自为战 vs 共享租约协同")
+  p.add_argument("--nodes", type=int, default=3, help="抢票进程数")
+  p.add_argument("--targets", type=int, default=3, help="抢票目标数")
+  p.add_argument("--rooms", type=int, default=4, help="每个时段的场地数")
+  p.add_argument("--open-after", type=float, default=6, help="启动后多少秒放票")
+  p.add_argument("--seconds", type=float, default=10, help="放票后最长运行时间")
+  p.add_argument("--delay-ms", type=int, default=100, help="抢票请求间隔 (request_delay_ms)")
+  p.add_argument("--server-delay-ms", type=float, default=20, help="替身服务器处理延迟")
+  p.add_argument("--ttl", type=float, default=2, help="租约/心跳有效期 (ttl_seconds)")
+  p.set_defaults(func=bench_cluster)
+
+  args = parser.parse_args()
+  args.func(args)
+
+
+if __name__ == "__main__":
+  main()
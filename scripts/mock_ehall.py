@@ -0,0 +1,299 @@
+# scripts/mock_ehall.py
+# -*- coding: utf-8 -*-
+"""
+本地 ehall 替身服务器：模拟场馆查询/预约接口，供基准测试和多进程联调使用。
+
+用法:
+  python scripts/mock_ehall.py --port 8443 --tls --h2 --delay-ms 30
+  然后在 config.json 中设置 "base_url": "https://127.0.0.1:8443", "verify_tls": "<cert.pem 路径>"
+
+支持 HTTP/1.1 keep-alive；开启 --tls --h2 且安装了 h2 时通过 ALPN 协商 HTTP/2。
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from collections import Counter
+from urllib.parse import parse_qs, urlsplit
+
+SLOTS = [f"{h:02d}:00-{h + 1:02d}:00" for h in range(8, 22)]
+
+_HTML_LOGIN = b"<html><head><title>CAS</title></head><body>authserver</body></html>"
+
+
+def generate_self_signed(directory=None):
+  """用 openssl 生成 localhost/127.0.0.1 的自签名证书，返回 (cert, key) 路径"""
+  directory = directory or tempfile.mkdtemp(prefix="mock_ehall_")
+  cert = os.path.join(directory, "cert.pem")
+  key = os.path.join(directory, "key.pem")
+  subprocess.run(
+    ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+     "-keyout", key, "-out", cert, "-subj", "/CN=localhost",
+     "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1"],
+    check=True, capture_output=True
+  )
+  return cert, key
+
+
+class MockEhall:
+  """
+  接口行为:
+  - getOpeningRoom.do: 每个时段 rooms 个场地，被预约后 disabled
+  - insertVenueBookingInfo.do: 成功 / 已被他人预约 / 本人重复预约
+  - require_cookie=True 时未携带 Cookie 的请求返回 CAS 登录页 (模拟 Cookie 失效)
+  - open_after 秒内所有场地都是 disabled，预约返回"未开放" (模拟整点放票)
+  - /__arrivals: 返回并清空各请求的到达时刻，供跨进程的基准测试读取
+  - /__bookings: 返回全部预约记录 [{XMDM, YYRQ, KYYSJD, CDWID, YYRGH, after_open}]
+  """
+
+  def __init__(self, rooms=8, delay_ms=0, jitter_ms=0, require_cookie=False, open_after=0):
+    self.rooms = rooms
+    self.delay_ms = delay_ms
+    self.jitter_ms = jitter_ms
+    self.require_cookie = require_cookie
+    self.open_at = time.monotonic() + open_after
+    self.lock = threading.Lock()
+    self.reset()
+
+  def reset(self):
+    with self.lock:
+      # (XMDM, YYRQ, KYYSJD, CDWID) -> 预约人学号
+      self.bookings = {}
+      # 同上 key -> 相对放票时刻的秒数
+      self.booked_at = {}
+      # [(接口名, 到达时刻 perf_counter)]
+      self.arrivals = []
+      self.connections = 0
+      self.protocols = Counter()
+
+  def _is_open(self):
+    return time.monotonic() >= self.open_at
+
+  def _rows(self, xmdm, date, slot):
+    rows = []
+    for i in range(1, self.rooms + 1):
+      wid = f"{xmdm}-{i}"
+      disabled = not self._is_open() or (xmdm, date, slot, wid) in self.bookings
+      rows.append({"WID": wid, "CDMC": f"{i}号场", "disabled": disabled})
+    return rows
+
+  def handle(self, path, form, headers):
+    """处理一次请求，返回 (HTTP 状态码, 响应体 bytes)"""
+    name = path.rsplit("/", 1)[-1]
+    with self.lock:
+      if name == "__arrivals":
+        # 基准测试用：取出并清空到达记录
+        arrivals, self.arrivals = self.arrivals, []
+        return 200, json.dumps(arrivals).encode("utf-8")
+      if name == "__bookings":
+        rows = [
+          {"XMDM": x, "YYRQ": d, "KYYSJD": t, "CDWID": w, "YYRGH": who,
+           "after_open": self.booked_at[(x, d, t, w)]}
+          for (x, d, t, w), who in self.bookings.items()
+        ]
+        return 200, json.dumps(rows).encode("utf-8")
+      self.arrivals.append((name, time.perf_counter()))
+
+    if self.require_cookie and not headers.get("cookie"):
+      return 200, _HTML_LOGIN
+
+    f = {k: v[0] for k, v in form.items()}
+    if name == "getSportVenueData.do":
+      res = {
+        "packageVenueList": [{"CGBM": "008", "CGMC": "模拟羽毛球馆", "SSXQ": "1"}],
+        "dismissalVenueList": [{"CGBM": "004", "CGMC": "模拟健身房", "SSXQ": "1"}],
+        "xmList": [{"XMDM": "002", "XMMC": "羽毛球", "DCFS": "1"}, {"XMDM": "007", "XMMC": "健身", "DCFS": "2"}],
+      }
+    elif name == "getTimeList.do":
+      res = {"datas": {"getTimeList": {"rows": [{"KSSJ": s[:5], "JSSJ": s[6:]} for s in SLOTS]}}}
+    elif name == "getOpeningRoom.do":
+      slot = f"{f.get('KSSJ')}-{f.get('JSSJ')}"
+      with self.lock:
+        rows = self._rows(f.get("XMDM"), f.get("YYRQ"), slot)
+      res = {"datas": {"getOpeningRoom": {"rows": rows}}}
+    elif name == "insertVenueBookingInfo.do":
+      key = (f.get("XMDM"), f.get("YYRQ"), f.get("KYYSJD"), f.get("CDWID"))
+      with self.lock:
+        owner = self.bookings.get(key)
+        if not self._is_open():
+          res = {"code": "1", "msg": "预约未开放"}
+        elif owner is None:
+          self.bookings[key] = f.get("YYRGH")
+          self.booked_at[key] = time.monotonic() - self.open_at
+          res = {"code": "0", "msg": "预约成功"}
+        elif owner == f.get("YYRGH"):
+          res = {"code": "1", "msg": "重复预约"}
+        else:
+          res = {"code": "1", "msg": "该场地已被预约"}
+    else:
+      return 404, b'{"msg": "not found"}'
+    return 200, json.dumps(res, ensure_ascii=False).encode("utf-8")
+
+  async def dispatch(self, path, body, headers):
+    if self.delay_ms or self.jitter_ms:
+      await asyncio.sleep((self.delay_ms + random.uniform(0, self.jitter_ms)) / 1000)
+    form = parse_qs(body.decode("utf-8"), keep_blank_values=True)
+    return self.handle(urlsplit(path).path, form, headers)
+
+  # ---------------- 连接处理 ----------------
+
+  async def on_connection(self, reader, writer):
+    ssl_obj = writer.get_extra_info("ssl_object")
+    proto = ssl_obj.selected_alpn_protocol() if ssl_obj else None
+    with self.lock:
+      self.connections += 1
+      self.protocols[proto or "http/1.1"] += 1
+    try:
+      if proto == "h2":
+        await self._serve_h2(reader, writer)
+      else:
+        await self._serve_http1(reader, writer)
+    except (ConnectionError, asyncio.IncompleteReadError, ssl.SSLError):
+      pass
+    finally:
+      writer.close()
+
+  async def _serve_http1(self, reader, writer):
+    while True:
+      line = await reader.readline()
+      if not line:
+        return
+      method, target, _ = line.decode("latin-1").split(" ", 2)
+      headers = {}
+      while True:
+        h = await reader.readline()
+        if h in (b"\r\n", b"\n", b""):
+          break
+        k, v = h.decode("latin-1").split(":", 1)
+        headers[k.strip().lower()] = v.strip()
+      body = await reader.readexactly(int(headers.get("content-length", 0)))
+      status, payload = await self.dispatch(target, body, headers)
+      writer.write(
+        f"HTTP/1.1 {status} {'OK' if status == 200 else 'Not Found'}\r\n"
+        f"Content-Type: application/json;charset=UTF-8\r\n"
+        f"Content-Length: {len(payload)}\r\n\r\n".encode("latin-1") + payload
+      )
+      await writer.drain()
+
+  async def _serve_h2(self, reader, writer):
+    import h2.config
+    import h2.connection
+    import h2.events
+
+    conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False, header_encoding="utf-8"))
+    conn.initiate_connection()
+    writer.write(conn.data_to_send())
+    streams = {}
+
+    async def respond(stream_id, headers, body):
+      status, payload = await self.dispatch(headers.get(":path", "/"), bytes(body), headers)
+      conn.send_headers(stream_id, [
+        (":status", str(status)),
+        ("content-type", "application/json;charset=UTF-8"),
+        ("content-length", str(len(payload))),
+      ])
+      conn.send_data(stream_id, payload, end_stream=True)
+      writer.write(conn.data_to_send())
+
+    while True:
+      data = await reader.read(65535)
+      if not data:
+        return
+      for ev in conn.receive_data(data):
+        if isinstance(ev, h2.events.RequestReceived):
+          streams[ev.stream_id] = ({k.lower(): v for k, v in ev.headers}, bytearray())
+        elif isinstance(ev, h2.events.DataReceived):
+          streams[ev.stream_id][1].extend(ev.data)
+          conn.acknowledge_received_data(ev.flow_controlled_length, ev.stream_id)
+        elif isinstance(ev, h2.events.StreamEnded):
+          headers, body = streams.pop(ev.stream_id)
+          asyncio.ensure_future(respond(ev.stream_id, headers, body))
+        elif isinstance(ev, h2.events.ConnectionTerminated):
+          writer.write(conn.data_to_send())
+          return
+      writer.write(conn.data_to_send())
+      await writer.drain()
+
+
+def make_ssl_context(cert, key, h2=True):
+  ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+  ctx.load_cert_chain(cert, key)
+  alpn = ["http/1.1"]
+  if h2:
+    try:
+      import h2 as _  # noqa: F401
+      alpn.insert(0, "h2")
+    except ImportError:
+      print("⚠️ 未安装 h2，只提供 HTTP/1.1")
+  ctx.set_alpn_protocols(alpn)
+  return ctx
+
+
+def start_in_thread(mock, host="127.0.0.1", port=0, ssl_context=None):
+  """在后台线程启动服务器，返回 (base_url, stop 函数)"""
+  ready = threading.Event()
+  state = {}
+
+  def run():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    server = loop.run_until_complete(asyncio.start_server(mock.on_connection, host, port, ssl=ssl_context))
+    state["loop"], state["port"] = loop, server.sockets[0].getsockname()[1]
+    ready.set()
+    loop.run_forever()
+    server.close()
+    loop.run_until_complete(server.wait_closed())
+    loop.close()
+
+  thread = threading.Thread(target=run, daemon=True)
+  thread.start()
+  ready.wait()
+
+  def stop():
+    state["loop"].call_soon_threadsafe(state["loop"].stop)
+    thread.join(timeout=5)
+
+  scheme = "https" if ssl_context else "http"
+  return f"{scheme}://{host}:{state['port']}", stop
+
+
+def main():
+  parser = argparse.ArgumentParser(description="本地 ehall 替身服务器")
+  parser.add_argument("--host", default="127.0.0.1")
+  parser.add_argument("--port", type=int, default=8443)
+  parser.add_argument("--tls", action="store_true", help="启用 TLS (自动生成自签名证书)")
+  parser.add_argument("--h2", action="store_true", help="通过 ALPN 提供 HTTP/2 (需要 --tls 和 h2)")
+  parser.add_argument("--rooms", type=int, default=8, help="每个时段的场地数 (0 表示永远无空场)")
+  parser.add_argument("--delay-ms", type=float, default=0, help="每个请求的固定处理延迟")
+  parser.add_argument("--jitter-ms", type=float, default=0, help="额外的随机延迟上限")
+  parser.add_argument("--require-cookie", action="store_true", help="无 Cookie 时返回登录页")
+  parser.add_argument("--open-after", type=float, default=0, help="启动后多少秒才放出场地")
+  args = parser.parse_args()
+
+  mock = MockEhall(args.rooms, args.delay_ms, args.jitter_ms, args.require_cookie, args.open_after)
+  ctx = None
+  if args.tls:
+    cert, key = generate_self_signed()
+    ctx = make_ssl_context(cert, key, h2=args.h2)
+    print(f"🔐 自签名证书: {cert}  (config.json 中设置 \"verify_tls\": \"{cert}\")")
+
+  async def serve():
+    server = await asyncio.start_server(mock.on_connection, args.host, args.port, ssl=ctx)
+    print(f"🏟️ mock ehall 已启动: {'https' if ctx else 'http'}://{args.host}:{args.port}")
+    async with server:
+      await server.serve_forever()
+
+  try:
+    asyncio.run(serve())
+  except KeyboardInterrupt:
+    pass
+
+
+if __name__ == "__main__":
+  main()
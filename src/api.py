@@ -2,8 +2,15 @@
 # -*- coding: utf-8 -*-
 import json
 import logging
+import re
+import threading
+import time
 import requests
 import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+from .net import PinnedHTTPAdapter, create_h2_session
 
 # 保持原脚本的环境设置
 os.environ['NO_PROXY'] = 'ehall.szu.edu.cn'
@@ -24,6 +31,50 @@ BASE_HEADERS = {
     'X-Requested-With': 'XMLHttpRequest',
 }
 
+# 共享连接池大小：并发查询/抢票时复用已建立的 TLS 连接
+POOL_SIZE = 16
+
+EHALL_BASE = "https://ehall.szu.edu.cn"
+# 可选传输方式：http1 = requests 连接池；http2 = httpx 多路复用 (ALPN 协商失败时自动退回 HTTP/1.1)
+TRANSPORTS = ("http1", "http2")
+
+_SLOT_RE = re.compile(r'(\d{1,2}:\d{2})\s*-\s*(\d{1,2}:\d{2})')
+
+
+def create_session(pool_size=POOL_SIZE, resolver=None, transport="http1", verify=True):
+    """
+    创建带连接池的共享 Session，多个 SzuApi 实例/线程复用同一批连接
+    :param resolver: net.HostResolver，传入时新连接固定到其预热测速选出的地址
+    :param transport: "http1" 或 "http2"；http2 依赖缺失时回退 http1
+    :param verify: TLS 校验，True/False 或 CA 文件路径 (本地测试替身用)
+    """
+    if transport not in TRANSPORTS:
+        logger.warning(f"未知的传输方式 {transport}，使用 http1")
+    elif transport == "http2":
+        session = create_h2_session(pool_size, resolver=resolver, verify=verify)
+        if session is not None:
+            return session
+
+    session = requests.Session()
+    if verify is not True:
+        # requests 会用 REQUESTS_CA_BUNDLE 等环境变量覆盖 session.verify，显式指定时不读环境变量
+        session.verify = verify
+        session.trust_env = False
+    if resolver is not None:
+        adapter = PinnedHTTPAdapter(resolver, pool_connections=4, pool_maxsize=pool_size)
+    else:
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def describe_transport(session):
+    """埋点用：会话的传输方式与实际协商到的协议"""
+    return {
+        "mode": getattr(session, "transport", "http1"),
+        "negotiated": getattr(session, "negotiated", None) or "HTTP/1.1",
+    }
+
 def parse_cookie_str(cookie_str):
     """解析Cookie字符串为字典"""
     cookies = {}
@@ -71,20 +122,184 @@ def safe_json_loads(content):
         logger.error(f"JSON解析失败: {e}, 内容预览: {preview}")
         raise e
 
+def extract_time_slots(res):
+    """
+    从 getTimeList.do 的返回中提取时间段列表 ["HH:MM-HH:MM", ...]
+    兼容 rows 中带 KSSJ/JSSJ 字段或直接是时间段字符串两种格式
+    """
+    slots = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            if node.get('KSSJ') and node.get('JSSJ'):
+                slots.append(f"{node['KSSJ']}-{node['JSSJ']}")
+                return
+            for v in node.values():
+                walk(v)
+        elif isinstance(node, list):
+            for v in node:
+                walk(v)
+        elif isinstance(node, str):
+            m = _SLOT_RE.fullmatch(node.strip())
+            if m:
+                slots.append(f"{m.group(1)}-{m.group(2)}")
+
+    walk(res)
+    # 去重并按开始时间排序 (补零后比较，兼容 "9:00" 这类写法)
+    return sorted(set(slots), key=lambda s: s.split('-')[0].zfill(5))
+
+# 预约返回中表示"该时段已由本人预约"的关键字 (对冲请求的另一路先成功时会出现)
+# 关键字只是推测，只有确实发出过对冲请求时才能据此判定为已约到
+DUPLICATE_KEYWORDS = ("重复", "已预约", "已存在")
+
+
+def is_duplicate_reply(text):
+    """判断预约返回是否像重复预约；调用方需确认本次确实发出过对冲请求"""
+    return any(k in text for k in DUPLICATE_KEYWORDS)
+
+
+class HedgedRequestError(Exception):
+    """对冲请求与原请求都失败 (异常)"""
+
+
+class RequestHedger:
+    """
+    对冲请求：预约请求超过近期延迟分位数仍未返回时，在另一条连接上重发同样的请求，
+    先返回者胜出。由 VenueBooker 持有并在多个 SzuApi 实例间共享，延迟样本和计数不随重载丢失。
+    """
+
+    MIN_SAMPLES = 5
+
+    def __init__(self, enabled=False, quantile=0.9, budget=20,
+                 default_delay=0.8, min_delay=0.05, max_delay=2.0, window=100):
+        self.enabled = enabled
+        self.quantile = quantile
+        self.budget = budget
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedge")
+        self.fired = 0
+        self.won = 0
+
+    def configure(self, enabled, quantile, budget):
+        """每轮抢票开始时按配置重置：预算按轮计算"""
+        with self._lock:
+            self.enabled = enabled
+            self.quantile = quantile
+            self.budget = budget
+            self.fired = 0
+            self.won = 0
+
+    def record(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def percentile(self, q):
+        """近期请求延迟的 q 分位数 (秒)，样本不足时返回 None"""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < self.MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def threshold(self):
+        """发出对冲请求前的等待时间 (秒)"""
+        p = self.percentile(self.quantile)
+        if p is None:
+            return self.default_delay
+        return min(self.max_delay, max(self.min_delay, p))
+
+    def _take_budget(self):
+        with self._lock:
+            if self.fired >= self.budget:
+                return False
+            self.fired += 1
+            return True
+
+    def run(self, fn, hedge_fn=None):
+        """
+        执行 fn()；超过阈值未返回且预算未用完时并发执行 hedge_fn() (默认再执行一次 fn)，返回先到的结果。
+        先到的结果若是异常、空结果或"重复预约" (说明另一路已成功)，另一路还在途时继续等待另一路。
+        fn 出错时应抛出异常而不是返回错误内容，否则会被当作有效结果。
+        :return: (结果, 是否发出了对冲请求)
+        :raises HedgedRequestError: 对冲后两路都抛出异常
+        """
+        primary = self._pool.submit(fn)
+        done, _ = wait([primary], timeout=self.threshold())
+        if done or not self._take_budget():
+            return primary.result(), False
+
+        logger.info("预约请求超过阈值未返回，发出对冲请求")
+        hedge = self._pool.submit(hedge_fn or fn)
+        pending = {primary, hedge}
+        fallback = None
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            fut = done.pop()
+            error = fut.exception()
+            if error is not None:
+                logger.warning(f"{'对冲' if fut is hedge else '原'}请求失败: {error}")
+                continue
+            result = fut.result()
+            if not result or is_duplicate_reply(json.dumps(result, ensure_ascii=False)):
+                # 另一路还没返回时不下结论；两路都没有更好的结果时返回它
+                fallback = fallback or result
+                continue
+            if fut is hedge:
+                with self._lock:
+                    self.won += 1
+            return result, True
+        if fallback is not None:
+            return fallback, True
+        raise HedgedRequestError(str(error))
+
+    def snapshot(self):
+        """埋点用：对冲触发/胜出次数与当前阈值"""
+        p50, p90 = self.percentile(0.5), self.percentile(0.9)
+        threshold = self.threshold()
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "fired": self.fired,
+                "won": self.won,
+                "budget_left": max(0, self.budget - self.fired),
+                "threshold_ms": round(threshold * 1000),
+                "p50_ms": round(p50 * 1000) if p50 is not None else None,
+                "p90_ms": round(p90 * 1000) if p90 is not None else None,
+                "samples": len(self._latencies),
+            }
+
 class SzuApi:
-    def __init__(self, cookie_str, stuid, stuname):
+    def __init__(self, cookie_str, stuid, stuname, session=None, hedger=None, base_url=EHALL_BASE, hedge_session=None):
+        self.base_url = base_url.rstrip('/')
         self.cookies = parse_cookie_str(cookie_str)
         self.stuid = str(stuid)
         self.stuname = str(stuname)
         self.headers = BASE_HEADERS.copy()
+        # 不传入时单独建一个；VenueBooker 会传入共享 Session 以便重载配置后仍复用连接
+        self.session = session or create_session()
+        self.hedger = hedger
+        # 对冲请求使用的会话：HTTP/2 下所有请求共用一条连接，对冲必须走另一条连接才有意义；
+        # 为 None 时用 self.session (HTTP/1.1 连接池会分配另一条空闲连接)
+        self.hedge_session = hedge_session
+
+    def _post(self, path, session=None, **kwargs):
+        """发送请求并记录延迟样本 (供对冲阈值使用)"""
+        start = time.perf_counter()
+        ret = (session or self.session).post(self.base_url + path, cookies=self.cookies, headers=self.headers, **kwargs)
+        if self.hedger is not None:
+            self.hedger.record(time.perf_counter() - start)
+        return ret
 
     def get_sys_config(self):
         """获取系统配置(场馆/项目信息)"""
         try:
-            ret = requests.post(
-                "https://ehall.szu.edu.cn/qljfwapp/sys/lwSzuCgyy/sportVenue/getSportVenueData.do",
-                cookies=self.cookies,
-                headers=self.headers,
+            ret = self._post(
+                "/qljfwapp/sys/lwSzuCgyy/sportVenue/getSportVenueData.do",
                 timeout=10,
                 allow_redirects=True 
             )
@@ -106,10 +321,8 @@ class SzuApi:
         """获取时间列表"""
         try:
             data = {'XQ': XQ, 'YYRQ': YYRQ, 'YYLX': YYLX, 'XMDM': XMDM}
-            ret = requests.post(
-                "https://ehall.szu.edu.cn/qljfwapp/sys/lwSzuCgyy/sportVenue/getTimeList.do",
-                cookies=self.cookies,
-                headers=self.headers,
+            ret = self._post(
+                "/qljfwapp/sys/lwSzuCgyy/sportVenue/getTimeList.do",
                 data=data,
                 timeout=5
             )
@@ -118,6 +331,13 @@ class SzuApi:
             logger.error(f"获取时间列表失败: {e}")
             return None
 
+    def get_time_slots(self, XQ, YYRQ, YYLX, XMDM):
+        """获取可预约时间段列表 ["HH:MM-HH:MM", ...]，失败返回 None"""
+        res = self.get_time_list(XQ, YYRQ, YYLX, XMDM)
+        if res is None:
+            return None
+        return extract_time_slots(res)
+
     def get_room(self, XMDM, YYRQ, YYLX, KSSJ, JSSJ, XQDM):
         """获取场地列表"""
         try:
@@ -125,10 +345,8 @@ class SzuApi:
                 'XMDM': XMDM, 'YYRQ': YYRQ, 'YYLX': YYLX,
                 'KSSJ': KSSJ, 'JSSJ': JSSJ, 'XQDM': XQDM,
             }
-            ret = requests.post(
-                "https://ehall.szu.edu.cn/qljfwapp/sys/lwSzuCgyy/modules/sportVenue/getOpeningRoom.do",
-                cookies=self.cookies,
-                headers=self.headers,
+            ret = self._post(
+                "/qljfwapp/sys/lwSzuCgyy/modules/sportVenue/getOpeningRoom.do",
                 data=data,
                 timeout=5
             )
@@ -141,7 +359,10 @@ class SzuApi:
             return None
 
     def post_book(self, CGDM, CDWID, XMDM, XQWID, KYYSJD, YYRQ, YYLX):
-        """提交预约"""
+        """
+        提交预约
+        :return: (返回内容, 本次是否发出了对冲请求)
+        """
         try:
             times = KYYSJD.split('-')
             data = {
@@ -155,14 +376,25 @@ class SzuApi:
                 'YYKS': f"{YYRQ} {times[0]}",
                 'YYJS': f"{YYRQ} {times[1]}"
             }
-            ret = requests.post(
-                "https://ehall.szu.edu.cn/qljfwapp/sys/lwSzuCgyy/sportVenue/insertVenueBookingInfo.do",
-                cookies=self.cookies,
-                headers=self.headers,
-                data=data,
-                timeout=5
-            )
-            return safe_json_loads(ret.content)
+            if self.hedger is not None and self.hedger.enabled:
+                return self.hedger.run(
+                    lambda: self._send_book(data),
+                    lambda: self._send_book(data, self.hedge_session)
+                )
+            return self._send_book(data), False
+        except HedgedRequestError as e:
+            logger.error(f"预约请求与对冲请求均异常: {e}")
+            return {"msg": str(e)}, True
         except Exception as e:
             logger.error(f"预约请求异常: {e}")
-            return {"msg": str(e)}
\ No newline at end of file
+            return {"msg": str(e)}, False
+
+    def _send_book(self, data, session=None):
+        """发送一次预约请求；对冲模式下可能在两条连接上并发执行。出错时抛出异常，由 post_book 统一处理"""
+        ret = self._post(
+            "/qljfwapp/sys/lwSzuCgyy/sportVenue/insertVenueBookingInfo.do",
+            session=session,
+            data=data,
+            timeout=5
+        )
+        return safe_json_loads(ret.content)
\ No newline at end of file
@@ -6,25 +6,145 @@ import time
 import logging
 import asyncio
 import copy
+import importlib
+import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from .api import SzuApi
-
-# 尝试导入自动登录模块
-try:
-  from .login import get_new_cookie
-except ImportError:
-  get_new_cookie = None
+from urllib.parse import urlsplit
+from .api import EHALL_BASE, SzuApi, RequestHedger, create_session, describe_transport, is_duplicate_reply
+from .coordination import target_key
+from .net import HostResolver
 
 logger = logging.getLogger(__name__)
 
+# 自动登录后端: 名称 -> (模块, 函数)。selenium 等依赖很重，只在第一次需要续期时才导入
+LOGIN_BACKENDS = {
+  "selenium": (".login", "get_new_cookie"),
+}
+DEFAULT_LOGIN_BACKEND = "selenium"
+_login_backend_cache = {}
+
+
+def load_login_backend(name=DEFAULT_LOGIN_BACKEND):
+  """
+  按名称加载自动登录函数 get_new_cookie(username, password, headless, host_rules=None)
+  :return: 函数；后端不存在或依赖缺失时返回 None
+  """
+  if name in _login_backend_cache:
+    return _login_backend_cache[name]
+
+  func = None
+  if name not in LOGIN_BACKENDS:
+    logger.error(f"未知的登录后端: {name}")
+  else:
+    module_name, attr = LOGIN_BACKENDS[name]
+    try:
+      module = importlib.import_module(module_name, __package__)
+      func = getattr(module, attr)
+    except ImportError as e:
+      logger.error(f"登录后端 {name} 依赖缺失: {e}")
+
+  _login_backend_cache[name] = func
+  return func
+
+# #venue check 默认并发度 (可通过 config.json 的 check_concurrency 覆盖)
+DEFAULT_CHECK_CONCURRENCY = 8
+# 单条 QQ 消息的安全长度
+MAX_MSG_LEN = 1500
+
+_DATE_RE = re.compile(r'^(\d{4}-)?\d{1,2}-\d{1,2}$')
+_RANGE_RE = re.compile(r'^(\d{1,2}:\d{2})-(\d{1,2}:\d{2})$')
+_YYLX_RE = re.compile(r'^\d\.\d$')
+YYLX_NAMES = {"1.0": "包场", "2.0": "散场"}
+
+
+def _hm(t):
+  """'9:00' -> '09:00'，便于字符串比较"""
+  return t.strip().zfill(5)
+
+
+def _check_label(xmdm, xq, yylx):
+  """汇总表中一行的标题: 项目@校区 预约类型"""
+  return f"{xmdm}@{xq} {YYLX_NAMES.get(yylx, yylx)}"
+
+
+def _parse_date(tok):
+  """YYYY-MM-DD / MM-DD -> date；MM-DD 已过去时视为明年 (12 月底查 1 月初)"""
+  today = datetime.now().date()
+  candidates = [f"{today.year}-{tok}", f"{today.year + 1}-{tok}"] if tok.count("-") == 1 else [tok]
+  for text in candidates:
+    try:
+      day = datetime.strptime(text, "%Y-%m-%d").date()
+    except ValueError:
+      continue
+    if len(candidates) == 1 or day >= today:
+      return day
+  raise ValueError(f"无效的日期: {tok}")
+
+
+def parse_check_args(args):
+  """
+  解析 #venue check 参数: [XMDM] [XQ] [日期] [HH:MM-HH:MM] [YYLX]
+  日期支持 YYYY-MM-DD / MM-DD / +N(N天后)，其余按格式自动识别
+  :return: dict 查询条件；无参数时返回 None (表示查询所有配置目标)
+  """
+  if not args:
+    return None
+
+  query = {}
+  codes = []
+  for tok in args:
+    if tok.startswith("+") and tok[1:].isdigit():
+      query["YYRQ"] = (datetime.now() + timedelta(days=int(tok[1:]))).strftime("%Y-%m-%d")
+    elif _DATE_RE.match(tok):
+      query["YYRQ"] = _parse_date(tok).strftime("%Y-%m-%d")
+    elif _RANGE_RE.match(tok):
+      start, end = _RANGE_RE.match(tok).groups()
+      query["KSSJ"], query["JSSJ"] = _hm(start), _hm(end)
+    elif _YYLX_RE.match(tok):
+      query["YYLX"] = tok
+    elif tok.isdigit():
+      codes.append(tok)
+    else:
+      raise ValueError(f"无法识别的参数: {tok}")
+
+  if not codes or len(codes) > 2:
+    raise ValueError("需要提供项目代码 XMDM (可选校区 XQ)")
+  query["XMDM"] = codes[0]
+  query["XQ"] = codes[1] if len(codes) > 1 else "1"
+  return query
+
 
 class VenueBooker:
   def __init__(self, config_path):
     self.config_path = config_path
-    self.config = {}
+    self._config = {}
+    # 配置在第一次访问 self.config 时才读取，插件加载时不做任何 IO
+    self._config_loaded = False
     self.api = None
-    # 初始化时不强制检查网络，避免阻塞
-    self.reload_config(force_check=False)
+    # 域名解析缓存：预热时测速并固定到最快的地址
+    self.resolver = HostResolver()
+    # 所有 SzuApi 实例共享同一个连接池，重载配置后连接依旧是热的；读取配置后按 transport 创建
+    self.session = None
+    self._session_opts = None
+    # HTTP/2 下对冲请求走的独立 HTTP/1.1 会话 (同一条 h2 连接上的第二个流绕不开慢连接/丢包)
+    self.hedge_session = None
+    # 预约请求对冲：延迟样本与计数跨配置重载保留
+    self.hedger = RequestHedger()
+    # #venue check 专用线程池，按 check_concurrency 创建
+    self._check_executor = None
+    self._check_executor_size = 0
+
+  @property
+  def config(self):
+    if not self._config_loaded:
+      # 初始化时不强制检查网络，避免阻塞
+      self.reload_config(force_check=False)
+    return self._config
+
+  @config.setter
+  def config(self, value):
+    self._config = value
 
   def save_config(self):
     """保存当前配置到文件"""
@@ -35,12 +155,95 @@ class VenueBooker:
     except Exception as e:
       logger.error(f"保存配置文件失败: {e}")
 
+  def _make_api(self, cookie_str):
+    """按当前配置创建 SzuApi；传输方式/TLS 设置变化时才重建共享会话"""
+    opts = (self.config.get("transport", "http1"), self.config.get("verify_tls", True))
+    if self.session is None or opts != self._session_opts:
+      for old in (self.session, self.hedge_session):
+        if old is not None:
+          old.close()
+      self.session = create_session(resolver=self.resolver, transport=opts[0], verify=opts[1])
+      self.hedge_session = None
+      if getattr(self.session, "transport", "http1") == "http2":
+        self.hedge_session = create_session(resolver=self.resolver, transport="http1", verify=opts[1])
+      self._session_opts = opts
+
+    return SzuApi(
+      cookie_str,
+      self.config.get("stuid", ""),
+      self.config.get("stuname", ""),
+      session=self.session,
+      hedger=self.hedger,
+      base_url=self.config.get("base_url", EHALL_BASE),
+      hedge_session=self.hedge_session
+    )
+
+  def _make_coordinator(self):
+    """按 coordination 配置创建多节点协同器，未配置返回 None"""
+    conf = self.config.get("coordination")
+    if not conf:
+      return None
+    try:
+      from .coordination import Coordinator
+
+      conf = dict(conf)
+      store = conf.get("store") or ""
+      # sqlite 相对路径按配置文件所在目录解析，宿主进程和抢票子进程看到的是同一个文件
+      if store.startswith("sqlite:///") and not os.path.isabs(store[len("sqlite:///"):]):
+        base_dir = os.path.dirname(os.path.abspath(self.config_path))
+        conf["store"] = "sqlite:///" + os.path.join(base_dir, store[len("sqlite:///"):])
+      return Coordinator.from_config(conf)
+    except Exception as e:
+      logger.error(f"协同存储初始化失败，按单节点运行: {e}")
+      return None
+
+  def prewarm(self):
+    """预解析 ehall / authserver 并固定到最快的可用地址，返回 {host: ip}"""
+    base_url = self.config.get("base_url", EHALL_BASE)
+    if base_url == EHALL_BASE:
+      pinned = self.resolver.warm()
+    else:
+      # 指向本地替身等其它地址时，只预热它自己 (IP 地址无需解析)
+      host = urlsplit(base_url).hostname
+      pinned = self.resolver.warm([host] if host and not host.replace(".", "").isdigit() else [])
+    logger.info(f"域名预热完成: {pinned}")
+    return pinned
+
+  def get_stats(self):
+    """埋点数据：当前固定的连接地址、请求延迟与对冲统计"""
+    return {
+      "endpoints": self.resolver.snapshot(),
+      "hedge": self.hedger.snapshot(),
+      "transport": describe_transport(self.session) if self.session is not None else None,
+    }
+
+  def format_stats(self):
+    """管理员指令：网络状态"""
+    stats = self.get_stats()
+    msg = "📡 **网络状态**\n"
+    if not stats["endpoints"]:
+      msg += "尚未预热 (使用系统解析)\n"
+    for host, ep in stats["endpoints"].items():
+      rtt = f"{ep['rtt_ms']}ms" if ep["rtt_ms"] is not None else "-"
+      msg += f"- {host} -> {ep['pinned'] or '系统解析'} ({rtt}, 可用 {ep['healthy']}, 失败 {ep['failed']})\n"
+
+    if stats["transport"]:
+      t = stats["transport"]
+      msg += f"🔌 传输: {t['mode']} (实际协议 {t['negotiated']})\n"
+
+    h = stats["hedge"]
+    msg += f"\n⏱️ 请求延迟: p50 {h['p50_ms'] or '-'}ms / p90 {h['p90_ms'] or '-'}ms (样本 {h['samples']})\n"
+    msg += f"🪁 对冲: {'开启' if h['enabled'] else '关闭'}，阈值 {h['threshold_ms']}ms，"
+    msg += f"本轮触发 {h['fired']} 次 / 胜出 {h['won']} 次 / 剩余预算 {h['budget_left']}"
+    return msg
+
   def reload_config(self, force_check=False):
     """
     加载配置文件并检查Cookie有效性
     :param force_check: 是否验证Cookie并尝试自动续期
     :return: (bool: success, str: message/error)
     """
+    self._config_loaded = True
     if os.path.exists(self.config_path):
       # 读取配置
       with open(self.config_path, 'r', encoding='utf-8-sig') as f:
@@ -52,11 +255,7 @@ class VenueBooker:
           return False, err
 
       # 初始化API
-      self.api = SzuApi(
-        self.config.get("cookie", ""),
-        self.config.get("stuid", ""),
-        self.config.get("stuname", "")
-      )
+      self.api = self._make_api(self.config.get("cookie", ""))
 
       # 如果不需要检查，直接返回成功
       if not force_check:
@@ -78,12 +277,14 @@ class VenueBooker:
       else:
         logger.info("检测到 Cookie 失效，启动浏览器进行自动续期...")
 
+        get_new_cookie = load_login_backend(self.config.get("login_backend", DEFAULT_LOGIN_BACKEND))
         if get_new_cookie:
-          # 调用 login.py (强制 headless 模式)
+          # 调用 login.py (强制 headless 模式)，浏览器也连到预热时固定的 ehall/authserver 地址
           code, result = get_new_cookie(
             self.config.get("stuid"),
             self.config.get("password"),
-            headless=True
+            headless=True,
+            host_rules=self.resolver.pinned()
           )
 
           if code == "SUCCESS":
@@ -91,7 +292,7 @@ class VenueBooker:
             self.config["cookie"] = result
             self.save_config()
             # 重新初始化 API
-            self.api = SzuApi(result, self.config["stuid"], self.config["stuname"])
+            self.api = self._make_api(result)
             return True, "自动续期成功"
 
           elif code == "MFA_REQUIRED":
@@ -133,52 +334,153 @@ class VenueBooker:
 
     return msg
 
-  def test_room_list(self):
-    """管理员指令：测试获取场地"""
-    # 强制检查，确保测试结果准确
-    success, msg = self.reload_config(force_check=True)
-    if not success:
-      return f"无法执行查询：{msg}"
-
+  def _build_check_jobs(self, query):
+    """
+    生成查询任务列表 [(XMDM, XQ, YYLX, YYRQ, KYYSJD, label), ...]
+    query 为 None 时取配置中的所有目标，否则按 getTimeList 返回的时间段填充
+    """
     target_date = self.get_next_day_date()
-    # 默认测试参数，可根据需要调整
-    # 002:羽毛球, 1:粤海校区, 19:00-20:00
-    rooms = self.api.get_room(
-      XMDM="002",
-      YYRQ=target_date,
-      YYLX="1.0",
-      KSSJ="19:00",
-      JSSJ="20:00",
-      XQDM="1"
-    )
-
-    if rooms is None:
-      return f"获取 {target_date} 场地列表失败，API无响应。"
-
-    msg = f"🏸 **{target_date} 19:00-20:00 粤海羽毛球测试**\n"
-    available_count = 0
-    for r in rooms:
-      status = "❌占用" if r.get('disabled') else "✅空闲"
-      if not r.get('disabled'): available_count += 1
-      msg += f"- {r.get('CDMC')} ({status})\n"
-
-    msg += f"\n共 {len(rooms)} 个场地，可用: {available_count}"
+    jobs = []
+
+    if query is None:
+      for t in self.config.get("targets", []):
+        jobs.append((
+          t["XMDM"], t["XQWID"], t["YYLX"], target_date, t["KYYSJD"],
+          _check_label(t["XMDM"], t["XQWID"], t["YYLX"])
+        ))
+      # 同一组合可能被多个目标重复配置
+      return list(dict.fromkeys(jobs))
+
+    date = query.get("YYRQ", target_date)
+    yylx = query.get("YYLX", "1.0")
+    label = _check_label(query["XMDM"], query["XQ"], yylx)
+    slots = self.api.get_time_slots(query["XQ"], date, yylx, query["XMDM"])
+    if not slots:
+      # 时间列表拿不到时，退回按整点切分所给时间范围
+      start = int(query.get("KSSJ", "08:00")[:2])
+      end = int(query.get("JSSJ", "22:00")[:2])
+      slots = [f"{h:02d}:00-{h + 1:02d}:00" for h in range(start, end)]
+
+    lo, hi = query.get("KSSJ", "00:00"), query.get("JSSJ", "24:00")
+    for slot in slots:
+      kssj, jssj = (_hm(x) for x in slot.split("-"))
+      if kssj >= lo and jssj <= hi:
+        jobs.append((query["XMDM"], query["XQ"], yylx, date, f"{kssj}-{jssj}", label))
+    return jobs
+
+  def _get_check_executor(self, size):
+    """#venue check 专用线程池：默认线程池只有 min(32, cpu+4) 个线程，小机器上会压低并发"""
+    if self._check_executor is None or self._check_executor_size != size:
+      if self._check_executor is not None:
+        self._check_executor.shutdown(wait=False)
+      self._check_executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="venue-check")
+      self._check_executor_size = size
+    return self._check_executor
+
+  async def _query_rooms(self, jobs):
+    """有界并发地查询所有任务的场地，返回 {job: rows 或 None}"""
+    concurrency = max(1, int(self.config.get("check_concurrency", DEFAULT_CHECK_CONCURRENCY)))
+    sem = asyncio.Semaphore(concurrency)
+    executor = self._get_check_executor(concurrency)
+    loop = asyncio.get_running_loop()
+
+    async def one(job):
+      xmdm, xq, yylx, date, slot, _ = job
+      kssj, jssj = slot.split("-")
+      async with sem:
+        return await loop.run_in_executor(executor, self.api.get_room, xmdm, date, yylx, kssj, jssj, xq)
+
+    results = await asyncio.gather(*(one(j) for j in jobs))
+    return dict(zip(jobs, results))
+
+  async def check_availability(self, query=None):
+    """
+    管理员指令：并发查询场地空闲情况，返回适合单条消息的汇总表
+    :param query: parse_check_args 的结果；None 表示查询所有配置目标
+    """
+    if self.api is None:
+      success, msg = await asyncio.to_thread(self.reload_config, False)
+      if not success:
+        return f"无法执行查询：{msg}"
+
+    jobs = await asyncio.to_thread(self._build_check_jobs, query)
+    if not jobs:
+      return "⚠️ 没有可查询的目标或时间段。"
+
+    # 不预先检查 Cookie，直接查询；全部失败时再强制续期重试一次，正常情况只需一个 RTT
+    results = await self._query_rooms(jobs)
+    if all(r is None for r in results.values()):
+      success, msg = await asyncio.to_thread(self.reload_config, True)
+      if not success:
+        return f"无法执行查询：{msg}"
+      # Cookie 失效时时间列表也拿不到，之前的任务是按整点猜的时段，续期后重新生成
+      jobs = await asyncio.to_thread(self._build_check_jobs, query)
+      if not jobs:
+        return "⚠️ 没有可查询的目标或时间段。"
+      results = await self._query_rooms(jobs)
+
+    return self._format_check_summary(results)
+
+  def _format_check_summary(self, results):
+    """将查询结果整理为紧凑的网格文本: 每个项目一行，格子为 开始时间 空闲/总数"""
+    groups = {}
+    for (xmdm, xq, yylx, date, slot, label), rows in results.items():
+      groups.setdefault((date, label), []).append((slot, rows))
+
+    lines = []
+    total_free = 0
+    for (date, label), cells in groups.items():
+      parts = []
+      for slot, rows in sorted(cells, key=lambda c: c[0]):
+        start = slot.split("-")[0]
+        if rows is None:
+          parts.append(f"{start}⚠️")
+          continue
+        free = sum(1 for r in rows if not r.get('disabled'))
+        total_free += free
+        parts.append(f"{start}{'✅' if free else '❌'}{free}/{len(rows)}")
+      lines.append(f"[{date[5:]}] {label}: " + " ".join(parts))
+
+    msg = "🏸 **场地速览** (✅空闲/总数, ⚠️查询失败)\n" + "\n".join(lines)
+    msg += f"\n共 {len(results)} 个时段，空闲场地合计: {total_free}"
+    if len(msg) > MAX_MSG_LEN:
+      msg = msg[:MAX_MSG_LEN - 4] + "\n..."
     return msg
 
-  async def run_booking_cycle(self, host_api_sender):
-    """执行抢票循环"""
-    await host_api_sender("⏳ 正在进行赛前最终检查...")
+  def precheck(self):
+    """赛前检查：刷新域名固定，再强制刷新配置并验证 Cookie (失效时自动续期)"""
+    self.prewarm()
+    return self.reload_config(force_check=True)
 
-    # 1. 再次强制刷新配置（双保险）
-    def run_check():
-      return self.reload_config(force_check=True)
+  async def _submit_under_lease(self, coord, key, submit):
+    """
+    在线程中执行 submit()，请求在途期间每 ttl/3 续期一次目标租约。
+    post_book 的耗时 (超时、对冲重发、多地址重连) 可能超过 ttl，不续期的话租约会在途中过期，
+    其它节点随即接手并用另一个账号提交
+    """
+    task = asyncio.ensure_future(asyncio.to_thread(submit))
+    while True:
+      done, _ = await asyncio.wait({task}, timeout=coord.ttl / 3)
+      if done:
+        return task.result()
+      if not await asyncio.to_thread(coord.claim, key):
+        logger.warning(f"目标租约续期失败，可能已被其它节点接手: {key}")
+
+  async def run_booking_cycle(self, host_api_sender, precheck=True):
+    """
+    执行抢票循环
+    :param precheck: 是否先做赛前检查；调用方已经做过 (如独立抢票进程) 时传 False，避免窗口内重复探测/检查
+    """
+    if precheck:
+      await host_api_sender("⏳ 正在进行赛前最终检查...")
 
-    success, msg = await asyncio.to_thread(run_check)
+      # 1. 再次强制刷新配置（双保险），顺便刷新域名固定
+      success, msg = await asyncio.to_thread(self.precheck)
 
-    if not success:
-      # 如果登录都失败了，任务直接没法跑
-      await host_api_sender(f"⛔ **任务终止**: {msg}")
-      return
+      if not success:
+        # 如果登录都失败了，任务直接没法跑
+        await host_api_sender(f"⛔ **任务终止**: {msg}")
+        return
 
     if not self.config.get("targets"):
       await host_api_sender("⚠️ 没有配置抢票目标，停止任务。")
@@ -190,13 +492,27 @@ class VenueBooker:
 
     end_time = datetime.now() + timedelta(minutes=max_minutes)
 
-    await host_api_sender(f"🚀 开始执行 {target_date} 的抢票任务...\n将在 {max_minutes} 分钟后停止。")
+    # 对冲预算按轮计算
+    self.hedger.configure(
+      enabled=self.config.get("hedge_enabled", False),
+      quantile=self.config.get("hedge_quantile", 0.9),
+      budget=self.config.get("hedge_budget", 20)
+    )
+
+    # 多节点协同 (可选)：与其它实例分摊各目标的场地，任一节点约到即全体停止
+    coord = self._make_coordinator()
+
+    start_msg = f"🚀 开始执行 {target_date} 的抢票任务...\n将在 {max_minutes} 分钟后停止。"
+    if coord:
+      start_msg += f"\n协同模式: 节点 {coord.node_id}"
+    await host_api_sender(start_msg)
 
     # 准备任务队列
     pending_courses = []
     for t in self.config["targets"]:
       course = copy.deepcopy(t)
       course["YYRQ"] = target_date
+      course["_key"] = target_key(course)
       pending_courses.append(course)
 
     success_list = []
@@ -204,9 +520,19 @@ class VenueBooker:
     # 循环直到超时或全部完成
     while datetime.now() < end_time and len(pending_courses) > 0:
 
+      if coord:
+        await asyncio.to_thread(coord.tick)
+
       # 遍历副本
       for course in pending_courses[:]:
 
+        if coord:
+          owner = coord.booked_by(course["_key"])
+          if owner:
+            logger.info(f"目标已由节点 {owner} 约到，停止: {course['comment']}")
+            pending_courses.remove(course)
+            continue
+
         # --- 阶段 1: 寻找场地 (如果还未锁定 CDWID) ---
         if "CDWID" not in course:
           try:
@@ -217,8 +543,9 @@ class VenueBooker:
             )
 
             if rooms:
-              # 找到第一个非disabled的场地
-              valid_room = next((r for r in rooms if not r['disabled']), None)
+              # 找到第一个非disabled的场地；协同模式下各节点按排名分到不同的场地
+              free = [r for r in rooms if not r['disabled']]
+              valid_room = coord.pick_room(course["_key"], free) if coord else next(iter(free), None)
 
               if valid_room:
                 course["CDWID"] = valid_room["WID"]
@@ -233,15 +560,34 @@ class VenueBooker:
             continue
 
         # --- 阶段 2: 执行预约 (如果已锁定 CDWID) ---
+        if "CDWID" in course and coord:
+          # 提交前再查一次存储，其它节点刚约到就不再发请求；拿不到租约说明另一个节点的请求还在途
+          key = course["_key"]
+          blocked = await asyncio.to_thread(lambda: bool(coord.booked_by(key, fresh=True)) or not coord.claim(key))
+          if blocked:
+            continue
+
         if "CDWID" in course:
           logger.info(f"发起预约: {course['comment']} ({course.get('CDMC')})")
 
-          res = self.api.post_book(
-            course["CGDM"], course["CDWID"], course["XMDM"],
-            course["XQWID"], course["KYYSJD"], course["YYRQ"], course["YYLX"]
-          )
+          def book(c=course):
+            return self.api.post_book(
+              c["CGDM"], c["CDWID"], c["XMDM"],
+              c["XQWID"], c["KYYSJD"], c["YYRQ"], c["YYLX"]
+            )
+
+          if coord:
+            res, hedged = await self._submit_under_lease(coord, course["_key"], book)
+          else:
+            res, hedged = book()
 
           res_str = json.dumps(res, ensure_ascii=False) if res else ""
+          booked = (res and "成功" in res_str) or (hedged and is_duplicate_reply(res_str))
+          if coord:
+            # 约到则先记录 (其它节点提交前会查到)，再交出租约让下一个节点立即提交
+            if booked:
+              await asyncio.to_thread(coord.mark_booked, course["_key"], course.get("CDMC", ""))
+            await asyncio.to_thread(coord.release, course["_key"])
 
           if res and "成功" in res_str:
             msg = f"🎉 抢票成功: {course.get('CDMC')} ({course['comment']})"
@@ -250,6 +596,14 @@ class VenueBooker:
             await host_api_sender(msg)
             pending_courses.remove(course)
 
+          elif hedged and is_duplicate_reply(res_str):
+            # 本次发出了对冲请求，"重复预约"说明两路中的另一路已经约到
+            msg = f"🎉 抢票成功(重复预约提示): {course.get('CDMC')} ({course['comment']})"
+            logger.info(msg)
+            success_list.append(msg)
+            await host_api_sender(msg)
+            pending_courses.remove(course)
+
           elif "冲突" in res_str or "已被" in res_str:
             logger.warning(f"预约冲突，场地可能已被抢: {course.get('CDMC')}")
             # 清除锁定，下一轮重新找
@@ -263,4 +617,12 @@ class VenueBooker:
       await asyncio.sleep(delay_sec)
 
     summary = f"🏁 抢票任务结束。\n目标数: {len(self.config['targets'])}\n成功数: {len(success_list)}"
+    hedge = self.hedger.snapshot()
+    logger.info(f"本轮埋点: {self.get_stats()}")
+    if hedge["enabled"]:
+      summary += f"\n对冲: 触发 {hedge['fired']} 次, 胜出 {hedge['won']} 次"
+    if coord:
+      keys = [target_key({**t, "YYRQ": target_date}) for t in self.config["targets"]]
+      summary += f"\n协同: 在线节点 {len(coord.alive)} 个，其它节点约到 {len(coord.booked_elsewhere(keys))} 个"
+      coord.close()
     await host_api_sender(summary)
\ No newline at end of file
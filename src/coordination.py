@@ -0,0 +1,360 @@
+# src/coordination.py
+# -*- coding: utf-8 -*-
+"""
+多节点协同抢票：多个抢票实例共享一个租约存储。
+
+- 节点每轮写心跳；心跳超过 ttl 未更新即视为下线
+- 每个目标的在线节点按 rendezvous 哈希排序，空闲场地按排名轮流分给各节点，
+  各节点各自锁定不同的场地；节点下线后其场地在下一轮重新分给其它节点
+- 提交预约前必须持有该目标的短租约，请求返回后立即释放：同一目标同一时刻只有一个节点的请求在途，
+  不会多个账号同时约到；前一个节点撞场后，下一个节点已锁定好另一块场地，可以立即提交
+- 任一节点约到后立即写入 booked，其它节点提交前都会查询，随即停止该目标
+
+存储后端按 URL 选择，可通过 register_backend() 扩展:
+  sqlite:///path/to/lease.db   本机多进程 (同一台机器上的文件)
+  http://host:port             跨机器 (需配置 token)，服务端: python -m src.coordination serve --db lease.db --token <共享口令>
+"""
+import abc
+import hashlib
+import hmac
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 5
+
+
+class LeaseStore(abc.ABC):
+  """租约存储接口；时间一律以存储端时钟为准"""
+
+  @abc.abstractmethod
+  def heartbeat(self, node_id):
+    """写入/刷新节点心跳"""
+
+  @abc.abstractmethod
+  def alive_nodes(self, ttl):
+    """心跳在 ttl 秒内的节点列表"""
+
+  @abc.abstractmethod
+  def try_lease(self, key, node_id, ttl):
+    """获取或续期租约：无人持有、已过期或本节点持有时成功"""
+
+  @abc.abstractmethod
+  def release(self, key, node_id):
+    """释放本节点持有的租约"""
+
+  @abc.abstractmethod
+  def mark_booked(self, key, node_id, detail=""):
+    """记录目标已约到，只有第一个写入者返回 True"""
+
+  @abc.abstractmethod
+  def booked_by(self, key):
+    """返回约到该目标的节点 ID，未约到返回 None"""
+
+  @abc.abstractmethod
+  def booked(self):
+    """{key: {"node", "detail", "at"}}"""
+
+  def close(self):
+    pass
+
+
+class SQLiteLeaseStore(LeaseStore):
+  """SQLite 文件后端，适合同一台机器上的多个进程"""
+
+  def __init__(self, path, **options):
+    # 按需导入：协同是可选功能，插件加载时不引入 sqlite3 / http.server 等模块
+    import sqlite3
+
+    self.path = path
+    self._lock = threading.Lock()
+    # autocommit + WAL，读写互不阻塞；写冲突时最多等 2 秒
+    self._db = sqlite3.connect(path, timeout=2, isolation_level=None, check_same_thread=False)
+    self._db.execute("PRAGMA journal_mode=WAL")
+    self._db.execute("PRAGMA synchronous=NORMAL")
+    self._db.executescript("""
+      CREATE TABLE IF NOT EXISTS nodes (node_id TEXT PRIMARY KEY, seen REAL NOT NULL);
+      CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, node_id TEXT NOT NULL, expires REAL NOT NULL);
+      CREATE TABLE IF NOT EXISTS booked (key TEXT PRIMARY KEY, node_id TEXT NOT NULL, detail TEXT, at REAL NOT NULL);
+    """)
+
+  def _exec(self, sql, args=()):
+    with self._lock:
+      return self._db.execute(sql, args)
+
+  def heartbeat(self, node_id):
+    self._exec(
+      "INSERT INTO nodes(node_id, seen) VALUES(?, ?) ON CONFLICT(node_id) DO UPDATE SET seen = excluded.seen",
+      (node_id, time.time())
+    )
+
+  def alive_nodes(self, ttl):
+    rows = self._exec("SELECT node_id FROM nodes WHERE seen >= ? ORDER BY node_id", (time.time() - ttl,))
+    return [r[0] for r in rows.fetchall()]
+
+  def try_lease(self, key, node_id, ttl):
+    now = time.time()
+    cur = self._exec(
+      "INSERT INTO leases(key, node_id, expires) VALUES(?, ?, ?) "
+      "ON CONFLICT(key) DO UPDATE SET node_id = excluded.node_id, expires = excluded.expires "
+      "WHERE leases.node_id = excluded.node_id OR leases.expires < ?",
+      (key, node_id, now + ttl, now)
+    )
+    return cur.rowcount == 1
+
+  def release(self, key, node_id):
+    self._exec("DELETE FROM leases WHERE key = ? AND node_id = ?", (key, node_id))
+
+  def mark_booked(self, key, node_id, detail=""):
+    cur = self._exec(
+      "INSERT OR IGNORE INTO booked(key, node_id, detail, at) VALUES(?, ?, ?, ?)",
+      (key, node_id, detail, time.time())
+    )
+    return cur.rowcount == 1
+
+  def booked_by(self, key):
+    row = self._exec("SELECT node_id FROM booked WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+  def booked(self):
+    rows = self._exec("SELECT key, node_id, detail, at FROM booked").fetchall()
+    return {k: {"node": n, "detail": d, "at": at} for k, n, d, at in rows}
+
+  def close(self):
+    with self._lock:
+      self._db.close()
+
+
+# HTTP 后端允许远程调用的方法
+_REMOTE_OPS = ("heartbeat", "alive_nodes", "try_lease", "release", "mark_booked", "booked_by", "booked")
+
+
+class HttpLeaseStore(LeaseStore):
+  """网络后端：把调用转发给 serve() 启动的租约服务器 (服务端时钟为准，避免节点间时钟偏差)"""
+
+  def __init__(self, url, token=None, timeout=2, **options):
+    import requests
+
+    if not token:
+      raise ValueError("HTTP 租约存储需要配置 token")
+    self.url = url.rstrip("/")
+    self.timeout = timeout
+    self._session = requests.Session()
+    self._session.headers["Authorization"] = f"Bearer {token}"
+
+  def _call(self, op, *args):
+    ret = self._session.post(f"{self.url}/{op}", json={"args": list(args)}, timeout=self.timeout)
+    if ret.status_code == 401:
+      raise PermissionError("租约服务器拒绝了 token，请检查 coordination.token")
+    ret.raise_for_status()
+    return ret.json()["result"]
+
+  def heartbeat(self, node_id):
+    return self._call("heartbeat", node_id)
+
+  def alive_nodes(self, ttl):
+    return self._call("alive_nodes", ttl)
+
+  def try_lease(self, key, node_id, ttl):
+    return self._call("try_lease", key, node_id, ttl)
+
+  def release(self, key, node_id):
+    return self._call("release", key, node_id)
+
+  def mark_booked(self, key, node_id, detail=""):
+    return self._call("mark_booked", key, node_id, detail)
+
+  def booked_by(self, key):
+    return self._call("booked_by", key)
+
+  def booked(self):
+    return self._call("booked")
+
+  def close(self):
+    self._session.close()
+
+
+def serve(store, token, host="127.0.0.1", port=8765):
+  """把任意 LeaseStore 暴露为 HTTP 租约服务器 (阻塞运行)；所有请求都必须携带共享 token"""
+  from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+  if not token:
+    raise ValueError("租约服务器必须设置 token")
+  expected = f"Bearer {token}".encode("utf-8")
+
+  class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+      pass
+
+    def do_POST(self):
+      if not hmac.compare_digest(self.headers.get("Authorization", "").encode("utf-8"), expected):
+        self.send_error(401)
+        return
+      op = self.path.strip("/")
+      if op not in _REMOTE_OPS:
+        self.send_error(404)
+        return
+      body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+      payload = json.dumps({"result": getattr(store, op)(*body.get("args", []))}).encode("utf-8")
+      self.send_response(200)
+      self.send_header("Content-Type", "application/json")
+      self.send_header("Content-Length", str(len(payload)))
+      self.end_headers()
+      self.wfile.write(payload)
+
+  server = ThreadingHTTPServer((host, port), Handler)
+  logger.info(f"租约服务器已启动: http://{host}:{port}")
+  try:
+    server.serve_forever()
+  finally:
+    server.server_close()
+
+
+_BACKENDS = {
+  "sqlite": lambda url, **options: SQLiteLeaseStore(url[len("sqlite:///"):], **options),
+  "http": HttpLeaseStore,
+  "https": HttpLeaseStore,
+}
+
+
+def register_backend(scheme, factory):
+  """注册新的存储后端: factory(url, **options) -> LeaseStore，options 为 coordination 段中的 token 等"""
+  _BACKENDS[scheme] = factory
+
+
+def open_store(url, **options):
+  scheme = url.split(":", 1)[0]
+  if scheme not in _BACKENDS:
+    raise ValueError(f"不支持的租约存储: {url}")
+  return _BACKENDS[scheme](url, **options)
+
+
+def target_key(course):
+  """跨节点一致的目标标识"""
+  return "|".join(str(course.get(k, "")) for k in ("YYRQ", "CGDM", "XMDM", "XQWID", "KYYSJD", "YYLX"))
+
+
+def _score(node_id, key):
+  return int.from_bytes(hashlib.sha1(f"{node_id}|{key}".encode("utf-8")).digest()[:8], "big")
+
+
+class Coordinator:
+  """单个节点视角的协同逻辑，由 run_booking_cycle 每轮调用 tick()"""
+
+  def __init__(self, store, node_id=None, ttl=DEFAULT_TTL):
+    self.store = store
+    self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+    self.ttl = ttl
+    self.alive = [self.node_id]
+    self._booked = {}
+    # 本节点当前持有的目标租约
+    self._held = set()
+
+  @classmethod
+  def from_config(cls, conf):
+    """conf: config.json 中的 coordination 段"""
+    if not conf.get("store"):
+      raise ValueError("coordination 缺少 store")
+    store = open_store(conf["store"], token=conf.get("token"))
+    return cls(store, conf.get("node_id"), conf.get("ttl_seconds", DEFAULT_TTL))
+
+  def tick(self):
+    """写心跳并刷新在线节点/已约到列表；存储不可用时沿用上一次的结果"""
+    try:
+      self.store.heartbeat(self.node_id)
+      self.alive = self.store.alive_nodes(self.ttl) or [self.node_id]
+      self._booked = self.store.booked()
+    except Exception as e:
+      logger.warning(f"租约存储访问失败，沿用上次状态: {e}")
+
+  def pick_room(self, key, rooms):
+    """
+    从 rooms (该目标当前的空闲场地，按服务端顺序) 中选出本节点负责的场地：
+    在线节点按 rendezvous 哈希排名，排名第 r 的节点取第 r、r+n、... 块场地，取其中第一块；
+    节点数多于场地数时按排名轮流复用，仍保证每个节点手里都有一块可提交的场地
+    """
+    if not rooms:
+      return None
+    ranked = sorted(self.alive, key=lambda n: _score(n, key), reverse=True)
+    rank = ranked.index(self.node_id) if self.node_id in ranked else len(ranked)
+    return rooms[rank % len(rooms)]
+
+  def booked_by(self, key, fresh=False):
+    """目标是否已被约到；fresh=True 时直接查存储 (提交预约前使用)"""
+    if key in self._booked:
+      return self._booked[key]["node"]
+    if not fresh:
+      return None
+    try:
+      node = self.store.booked_by(key)
+    except Exception as e:
+      logger.warning(f"租约存储访问失败: {e}")
+      return None
+    if node:
+      self._booked[key] = {"node": node}
+    return node
+
+  def booked_elsewhere(self, keys):
+    """keys 中由其它节点约到的目标"""
+    return [k for k in keys if k in self._booked and self._booked[k]["node"] != self.node_id]
+
+  def claim(self, key):
+    """获取目标的提交租约；存储不可用时放行，宁可重复约到也不停手"""
+    try:
+      ok = self.store.try_lease(key, self.node_id, self.ttl)
+    except Exception as e:
+      logger.warning(f"租约存储访问失败: {e}")
+      return True
+    if ok:
+      self._held.add(key)
+    return ok
+
+  def release(self, key):
+    """提交返回后立即交出租约，下一个节点不必等租约过期"""
+    if key not in self._held:
+      return
+    self._held.discard(key)
+    try:
+      self.store.release(key, self.node_id)
+    except Exception as e:
+      logger.warning(f"租约存储访问失败: {e}")
+
+  def mark_booked(self, key, detail=""):
+    try:
+      first = self.store.mark_booked(key, self.node_id, detail)
+    except Exception as e:
+      logger.warning(f"记录约到状态失败: {e}")
+      return False
+    self._booked[key] = {"node": self.node_id, "detail": detail}
+    return first
+
+  def close(self):
+    self.store.close()
+
+
+def main():
+  import argparse
+
+  parser = argparse.ArgumentParser(description="协同抢票租约服务器")
+  sub = parser.add_subparsers(dest="cmd", required=True)
+  p = sub.add_parser("serve", help="以 HTTP 方式共享一个 SQLite 租约库")
+  p.add_argument("--db", default="lease.db")
+  p.add_argument("--host", default="127.0.0.1", help="跨机器使用时改为 0.0.0.0 或内网地址")
+  p.add_argument("--port", type=int, default=8765)
+  p.add_argument("--token", default=os.environ.get("SZU_LEASE_TOKEN"),
+                 help="共享口令，与各实例 coordination.token 一致 (也可用环境变量 SZU_LEASE_TOKEN)")
+  args = parser.parse_args()
+  if not args.token:
+    parser.error("必须通过 --token 或 SZU_LEASE_TOKEN 设置共享口令")
+
+  logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+  serve(SQLiteLeaseStore(args.db), args.token, args.host, args.port)
+
+
+if __name__ == "__main__":
+  main()
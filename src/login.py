@@ -1,9 +1,12 @@
 # src/login.py
 # -*- coding: utf-8 -*-
 import os
+import json
 import time
 import logging
+from urllib.parse import urlsplit
 from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
@@ -13,64 +16,165 @@ from webdriver_manager.chrome import ChromeDriverManager
 
 logger = logging.getLogger(__name__)
 
+EHALL_URL = "https://ehall.szu.edu.cn/qljfwapp/sys/lwSzuCgyy/index.do"
+# ehall 登录态 Cookie，出现即可提取
+SESSION_COOKIE = "MOD_AUTH_CAS"
+# 登录流程用不到的资源，直接在浏览器网络层拦截
+BLOCKED_RESOURCES = [
+  "*.png", "*.jpg", "*.jpeg", "*.gif", "*.svg", "*.ico", "*.webp",
+  "*.woff", "*.woff2", "*.ttf", "*.otf", "*.css",
+]
+# 浏览器配置目录 (user_data_dir 下)
+PROFILE_DIR = "SzuBotProfile"
+# 条件等待的轮询间隔 (秒)
+POLL_INTERVAL = 0.05
+# 已跳回 ehall 但迟迟等不到 SESSION_COOKIE 时，最多再等这么久就直接取现有 Cookie
+COOKIE_GRACE = 3
 
-def get_new_cookie(username, password, headless=False):
-  """
-  启动浏览器登录。
-  """
-  logger.info(f"启动自动登录 (Headless={headless})...")
+# ChromeDriverManager().install() 每次都会检查版本，进程内只做一次
+_driver_path = None
 
-  base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-  user_data_dir = os.path.join(base_dir, "scripts", "browser_data")
-  if not os.path.exists(user_data_dir):
-    os.makedirs(user_data_dir)
 
+class _StepTimer:
+  """记录登录各步骤耗时"""
+
+  def __init__(self):
+    self.start = self.last = time.perf_counter()
+
+  def mark(self, step):
+    now = time.perf_counter()
+    logger.info(f"⏱️ {step}: {(now - self.last) * 1000:.0f}ms (累计 {(now - self.start) * 1000:.0f}ms)")
+    self.last = now
+
+
+def _is_mfa(url):
+  return "authserver" in url and ("reAuthCheck" in url or "isMultifactor=true" in url)
+
+
+def _build_options(user_data_dir, headless, block_resources, host_rules=None):
   chrome_options = Options()
   chrome_options.add_argument(f"--user-data-dir={user_data_dir}")
-  chrome_options.add_argument("--profile-directory=SzuBotProfile")
+  chrome_options.add_argument(f"--profile-directory={PROFILE_DIR}")
 
   if headless:
-    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--headless=new")
 
   chrome_options.add_argument("--no-sandbox")
   chrome_options.add_argument("--disable-gpu")
+  chrome_options.add_argument("--disable-extensions")
+  chrome_options.add_argument("--no-first-run")
   chrome_options.add_argument(
     'user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
 
+  # 浏览器沿用预热时固定的地址，SNI 和证书校验仍使用原域名
+  if host_rules:
+    rules = ", ".join(f"MAP {host} {ip}" for host, ip in host_rules.items())
+    chrome_options.add_argument(f"--host-resolver-rules={rules}")
+
+  # DOMContentLoaded 即返回，不等图片/样式等子资源
+  chrome_options.page_load_strategy = "eager"
+  if block_resources:
+    # 只用命令行参数 + CDP 拦截，二者都只作用于本次会话；
+    # 不用 prefs，chromedriver 会把 prefs 写进持久化的 Profile，之后手动登录也看不到验证码图片
+    chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+  return chrome_options
+
+
+def _clear_persisted_image_block(user_data_dir):
+  """清除旧版本写进 Profile 的禁图设置"""
+  path = os.path.join(user_data_dir, PROFILE_DIR, "Preferences")
+  try:
+    with open(path, "r", encoding="utf-8") as f:
+      prefs = json.load(f)
+    settings = prefs.get("profile", {}).get("managed_default_content_settings", {})
+    if settings.pop("images", None) is None:
+      return
+    with open(path, "w", encoding="utf-8") as f:
+      json.dump(prefs, f)
+    logger.info("已清除 Profile 中的禁图设置")
+  except (OSError, ValueError) as e:
+    logger.debug(f"未清理 Profile 禁图设置: {e}")
+
+
+def _start_driver(chrome_options, block_resources):
+  global _driver_path
+  if _driver_path is None:
+    _driver_path = ChromeDriverManager().install()
+  driver = webdriver.Chrome(service=Service(_driver_path), options=chrome_options)
+
+  if block_resources:
+    try:
+      driver.execute_cdp_cmd("Network.enable", {})
+      driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_RESOURCES})
+    except WebDriverException as e:
+      logger.warning(f"资源拦截设置失败(不影响登录): {e}")
+  return driver
+
+
+def get_new_cookie(username, password, headless=False, target_url=EHALL_URL,
+                   session_cookie=SESSION_COOKIE, block_resources=None, user_data_dir=None, host_rules=None):
+  """
+  启动浏览器登录。
+  全程使用条件等待 (URL 变化 / Cookie 出现)，不做固定 sleep。
+  target_url / user_data_dir 可替换为本地替身页面，便于测速。
+  block_resources: 拦截图片/字体/样式，默认只在 headless 时开启 (有界面时需要人工看验证码)
+  host_rules: {域名: IP}，让浏览器连到 HostResolver 固定的地址
+  """
+  logger.info(f"启动自动登录 (Headless={headless})...")
+  timer = _StepTimer()
+
+  if user_data_dir is None:
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    user_data_dir = os.path.join(base_dir, "scripts", "browser_data")
+  if not os.path.exists(user_data_dir):
+    os.makedirs(user_data_dir)
+  _clear_persisted_image_block(user_data_dir)
+
+  if block_resources is None:
+    block_resources = headless
+
+  target_host = urlsplit(target_url).netloc
+
+  def on_target(url):
+    # 回到 ehall 且不在 authserver 上才算登录成功
+    return urlsplit(url).netloc == target_host and "authserver" not in url
+
   driver = None
   try:
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=chrome_options)
+    driver = _start_driver(_build_options(user_data_dir, headless, block_resources, host_rules), block_resources)
+    timer.mark("启动浏览器")
 
-    target_url = "https://ehall.szu.edu.cn/qljfwapp/sys/lwSzuCgyy/index.do"
     driver.get(target_url)
 
-    wait = WebDriverWait(driver, 10)
+    # 等待落地页稳定：要么停在 authserver 登录表单，要么 Profile 生效直接进了 ehall
+    def landed(d):
+      url = d.current_url
+      if on_target(url):
+        return "ehall"
+      if "authserver" in url and (_is_mfa(url) or d.find_elements(By.ID, "username")):
+        return "login"
+      return False
 
-    # 等待 URL 稳定
-    time.sleep(2)
+    landing = WebDriverWait(driver, 15, poll_frequency=POLL_INTERVAL).until(landed)
     current_url = driver.current_url
+    timer.mark(f"打开页面 ({landing})")
     logger.info(f"当前页面URL: {current_url}")
 
-    # ================== 核心逻辑修正 ==================
-
-    # 判定优先级 1: 只要包含 authserver，就是没登录，必须输入账号密码
-    if "authserver" in current_url:
+    if landing == "login" and not _is_mfa(current_url):
       logger.info("处于登录页面，开始自动操作...")
+      wait = WebDriverWait(driver, 10, poll_frequency=POLL_INTERVAL)
 
-      # 等待元素加载
-      user_input = wait.until(EC.presence_of_element_located((By.ID, "username")))
+      user_input = driver.find_element(By.ID, "username")
       pwd_input = driver.find_element(By.ID, "password")
-      submit_btn = driver.find_element(By.ID, "login_submit")
+      submit_btn = wait.until(EC.element_to_be_clickable((By.ID, "login_submit")))
 
       # 1. 勾选“七天免登录”
       try:
-        # 有些时候 checkbox 加载慢，尝试显式等待
-        remember_me = wait.until(EC.presence_of_element_located((By.ID, "rememberMe")))
+        remember_me = driver.find_element(By.ID, "rememberMe")
         if not remember_me.is_selected():
           remember_me.click()
           logger.info("✅ 已勾选'七天免登录'")
-      except Exception as e:
+      except WebDriverException as e:
         logger.warning(f"勾选七天免登录失败(不影响后续): {e}")
 
       # 2. 输入账号密码
@@ -82,49 +186,58 @@ def get_new_cookie(username, password, headless=False):
       pwd_input.clear()
       pwd_input.send_keys(password)
 
-      time.sleep(0.5)
       submit_btn.click()
+      timer.mark("填写并提交")
       logger.info("点击登录，等待跳转...")
 
-    # 判定优先级 2: 不含 authserver 且含 ehall，才是真的登录了
-    elif "ehall.szu.edu.cn" in current_url and "authserver" not in current_url:
+    elif landing == "ehall":
       logger.info("检测到已登录状态(Profile生效)，无需输入密码。")
 
-    # =================================================
-
-    # --- 循环检测跳转结果 ---
+    # --- 等待结果：ehall 会话 Cookie 出现即成功，MFA 页面即失败 ---
     # Headless模式给60秒，有界面模式(手动Init)给600秒等待人工操作
-    max_retries = 60 if headless else 600
-
-    for i in range(max_retries):
-      current_url = driver.current_url
-
-      # 1. 成功: URL 是 ehall 且不含 authserver
-      if "ehall.szu.edu.cn" in current_url and "authserver" not in current_url:
-        logger.info("🎉 成功跳转至 ehall 系统！")
-        time.sleep(1)  # 等待Cookie写入
-        cookies_list = driver.get_cookies()
-        cookie_str = "; ".join([f"{c['name']}={c['value']}" for c in cookies_list])
-        return "SUCCESS", cookie_str
-
-      # 2. 失败/风控: 仍在 authserver 且 URL 出现 MFA 特征
-      if "authserver" in current_url:
-        if "reAuthCheck" in current_url or "isMultifactor=true" in current_url:
-          if headless:
-            err_msg = "触发多因素认证(短信/验证码)，无法自动处理。"
-            logger.error(err_msg)
-            return "MFA_REQUIRED", err_msg
-          else:
-            if i % 5 == 0:
-              logger.warning("⚠️ 处于多因素认证页面！请手动操作...")
-
-      time.sleep(1)
-
-    return "ERROR", "登录超时或未跳转到目标页面"
+    timeout = 60 if headless else 600
+    state = {"on_target_since": None, "mfa_warned": 0.0}
+
+    def finished(d):
+      url = d.current_url
+      if on_target(url):
+        if d.get_cookie(session_cookie):
+          return "SUCCESS"
+        now = time.perf_counter()
+        state["on_target_since"] = state["on_target_since"] or now
+        if now - state["on_target_since"] > COOKIE_GRACE and d.get_cookies():
+          logger.warning(f"未等到 {session_cookie}，使用当前全部 Cookie")
+          return "SUCCESS"
+      elif _is_mfa(url):
+        if headless:
+          return "MFA_REQUIRED"
+        now = time.perf_counter()
+        if now - state["mfa_warned"] > 5:
+          logger.warning("⚠️ 处于多因素认证页面！请手动操作...")
+          state["mfa_warned"] = now
+      return False
+
+    try:
+      result = WebDriverWait(driver, timeout, poll_frequency=POLL_INTERVAL).until(finished)
+    except TimeoutException:
+      return "ERROR", "登录超时或未跳转到目标页面"
+    timer.mark("等待跳转与Cookie")
+
+    if result == "MFA_REQUIRED":
+      err_msg = "触发多因素认证(短信/验证码)，无法自动处理。"
+      logger.error(err_msg)
+      return "MFA_REQUIRED", err_msg
+
+    logger.info("🎉 成功跳转至 ehall 系统！")
+    cookies_list = driver.get_cookies()
+    cookie_str = "; ".join([f"{c['name']}={c['value']}" for c in cookies_list])
+    timer.mark("读取Cookie")
+    return "SUCCESS", cookie_str
 
   except Exception as e:
     logger.error(f"Selenium 运行异常: {e}")
     return "ERROR", str(e)
   finally:
     if driver:
-      driver.quit()
\ No newline at end of file
+      driver.quit()
+      timer.mark("关闭浏览器")
@@ -0,0 +1,241 @@
+# src/net.py
+# -*- coding: utf-8 -*-
+import logging
+import socket
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+logger = logging.getLogger(__name__)
+
+# 赛前需要预解析的域名
+WARM_HOSTS = ("ehall.szu.edu.cn", "authserver.szu.edu.cn")
+
+
+def system_resolve(host, port):
+    """系统解析器：返回去重后的 IP 列表 (保持系统返回顺序)"""
+    infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    return list(dict.fromkeys(info[4][0] for info in infos))
+
+
+def tcp_probe(ip, port, timeout):
+    """测量到 ip:port 的 TCP 建连耗时(毫秒)，失败返回 None"""
+    start = time.perf_counter()
+    try:
+        with socket.create_connection((ip, port), timeout=timeout):
+            return (time.perf_counter() - start) * 1000
+    except OSError:
+        return None
+
+
+class HostResolver:
+    """
+    域名解析缓存：预热时解析并测速所有地址，把连接固定到最快的可用地址上。
+    resolve_fn(host, port) / probe_fn(ip, port, timeout) 可替换，便于用本地替身测试。
+    """
+
+    def __init__(self, resolve_fn=None, probe_fn=None, port=443, probe_timeout=1.5):
+        self.resolve_fn = resolve_fn or system_resolve
+        self.probe_fn = probe_fn or tcp_probe
+        self.port = port
+        self.probe_timeout = probe_timeout
+        self._lock = threading.Lock()
+        # host -> {"addrs": [(ip, rtt_ms), ...] 按延迟升序, "pinned": ip/None, "failed": set, "warmed_at": ts}
+        self._entries = {}
+
+    def warm(self, hosts=WARM_HOSTS):
+        """解析并测速所有域名，返回 {host: 固定的 IP 或 None}"""
+        return {host: self._warm_one(host) for host in hosts}
+
+    def _warm_one(self, host):
+        try:
+            ips = self.resolve_fn(host, self.port)
+        except Exception as e:
+            # 解析失败时保留旧的固定结果，连接时仍可回退到系统解析
+            logger.warning(f"预解析 {host} 失败: {e}")
+            return self.pick(host)
+
+        if not ips:
+            return self.pick(host)
+
+        with ThreadPoolExecutor(max_workers=len(ips)) as pool:
+            rtts = list(pool.map(lambda ip: self.probe_fn(ip, self.port, self.probe_timeout), ips))
+
+        healthy = sorted(((ip, rtt) for ip, rtt in zip(ips, rtts) if rtt is not None), key=lambda x: x[1])
+        pinned = healthy[0][0] if healthy else None
+        with self._lock:
+            self._entries[host] = {
+                "addrs": healthy,
+                "pinned": pinned,
+                "failed": set(),
+                "warmed_at": time.time(),
+            }
+
+        if pinned:
+            logger.info(f"{host} 已固定到 {pinned} ({healthy[0][1]:.1f}ms, 共 {len(ips)} 个地址, {len(healthy)} 个可用)")
+        else:
+            logger.warning(f"{host} 的 {len(ips)} 个地址均不可达，使用系统解析")
+        return pinned
+
+    def pick(self, host):
+        """返回 host 当前固定的 IP；未预热或全部失败时返回 None (调用方使用系统解析)"""
+        with self._lock:
+            entry = self._entries.get(host)
+            return entry["pinned"] if entry else None
+
+    def pinned(self):
+        """{host: 固定的 IP}，只含当前有固定地址的域名；供浏览器登录等不走本会话的流量使用"""
+        with self._lock:
+            return {host: e["pinned"] for host, e in self._entries.items() if e["pinned"]}
+
+    def mark_failed(self, host, ip):
+        """连接固定地址失败时调用：切换到下一个可用地址"""
+        with self._lock:
+            entry = self._entries.get(host)
+            if not entry:
+                return
+            entry["failed"].add(ip)
+            nxt = next((a for a, _ in entry["addrs"] if a not in entry["failed"]), None)
+            entry["pinned"] = nxt
+        logger.warning(f"{host} 固定地址 {ip} 连接失败，切换到 {nxt or '系统解析'}")
+
+    def snapshot(self):
+        """埋点用：{host: {"pinned", "rtt_ms", "healthy", "failed"}}"""
+        with self._lock:
+            result = {}
+            for host, entry in self._entries.items():
+                rtt = dict(entry["addrs"]).get(entry["pinned"])
+                result[host] = {
+                    "pinned": entry["pinned"],
+                    "rtt_ms": round(rtt, 1) if rtt is not None else None,
+                    "healthy": len(entry["addrs"]),
+                    "failed": len(entry["failed"]),
+                }
+            return result
+
+
+def _pinned_connection_cls(base, resolver):
+    """生成按 resolver 结果建连的连接类；SNI / 证书校验 / Host 头仍使用原域名"""
+
+    class PinnedConnection(base):
+        def _new_conn(self):
+            host, dns_host = self.host, self._dns_host
+            ip = resolver.pick(host)
+            # urllib3 只在建立 TCP 连接时使用 _dns_host，TLS 握手前要换回域名
+            try:
+                # 依次尝试固定地址，失败则切换到下一个，全部失败后回退系统解析
+                while ip is not None:
+                    self._dns_host = ip
+                    try:
+                        return super()._new_conn()
+                    except (NewConnectionError, ConnectTimeoutError):
+                        resolver.mark_failed(host, ip)
+                        ip = resolver.pick(host)
+                self._dns_host = dns_host
+                return super()._new_conn()
+            finally:
+                self._dns_host = dns_host
+
+    return PinnedConnection
+
+
+class PinnedHTTPAdapter(HTTPAdapter):
+    """连接池中的新连接都按 HostResolver 固定的地址建立"""
+
+    def __init__(self, resolver, **kwargs):
+        self.resolver = resolver
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+
+        class PinnedHTTPPool(HTTPConnectionPool):
+            ConnectionCls = _pinned_connection_cls(HTTPConnection, self.resolver)
+
+        class PinnedHTTPSPool(HTTPSConnectionPool):
+            ConnectionCls = _pinned_connection_cls(HTTPSConnection, self.resolver)
+
+        self.poolmanager.pool_classes_by_scheme = {"http": PinnedHTTPPool, "https": PinnedHTTPSPool}
+
+
+def _pinned_network_backend(base, resolver):
+    """包装 httpcore 的网络后端：TCP 连接固定到 resolver 选出的地址，TLS 的 SNI 仍由 httpcore 使用原域名"""
+    import httpcore
+
+    class PinnedNetworkBackend:
+        def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+            kwargs = {"timeout": timeout, "local_address": local_address, "socket_options": socket_options}
+            ip = resolver.pick(host)
+            while ip is not None:
+                try:
+                    return base.connect_tcp(ip, port, **kwargs)
+                except (httpcore.ConnectError, httpcore.ConnectTimeout):
+                    resolver.mark_failed(host, ip)
+                    ip = resolver.pick(host)
+            return base.connect_tcp(host, port, **kwargs)
+
+        def connect_unix_socket(self, path, timeout=None, socket_options=None):
+            return base.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+        def sleep(self, seconds):
+            base.sleep(seconds)
+
+    return PinnedNetworkBackend()
+
+
+class H2Session:
+    """
+    requests.Session 风格的 HTTP/2 会话 (基于 httpx)。
+    通过 ALPN 协商 h2，所有并发请求复用同一条连接上的多路流；服务端不支持 h2 时 httpx 自动退回 HTTP/1.1 连接池。
+    """
+
+    transport = "http2"
+
+    def __init__(self, pool_size, resolver=None, verify=True):
+        import httpx
+
+        if isinstance(verify, str):
+            verify = ssl.create_default_context(cafile=verify)
+        self._transport = httpx.HTTPTransport(
+            http2=True,
+            verify=verify,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+        if resolver is not None:
+            pool = getattr(self._transport, "_pool", None)
+            if hasattr(pool, "_network_backend"):
+                pool._network_backend = _pinned_network_backend(pool._network_backend, resolver)
+            else:
+                logger.warning("当前 httpx 版本不支持替换网络后端，HTTP/2 连接不做地址固定")
+        self.client = httpx.Client(transport=self._transport)
+        # 最近一次响应实际使用的协议 ("HTTP/2" 或 "HTTP/1.1")，供埋点展示
+        self.negotiated = None
+
+    def post(self, url, cookies=None, headers=None, data=None, timeout=None, allow_redirects=True):
+        headers = dict(headers or {})
+        if cookies:
+            # httpx 不再支持逐请求传 cookies，直接拼成 Cookie 头
+            headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in cookies.items())
+        ret = self.client.post(url, headers=headers, data=data, timeout=timeout, follow_redirects=allow_redirects)
+        self.negotiated = ret.http_version
+        return ret
+
+    def close(self):
+        self.client.close()
+
+
+def create_h2_session(pool_size, resolver=None, verify=True):
+    """创建 HTTP/2 会话；未安装 httpx[http2] 时返回 None，由调用方回退到 HTTP/1.1"""
+    try:
+        import httpx  # noqa: F401
+        import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖 h2
+    except ImportError as e:
+        logger.warning(f"HTTP/2 传输不可用 ({e})，回退到 HTTP/1.1 连接池。可执行 pip install 'httpx[http2]'")
+        return None
+    return H2Session(pool_size, resolver=resolver, verify=verify)
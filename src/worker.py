@@ -0,0 +1,198 @@
+# src/worker.py
+# -*- coding: utf-8 -*-
+"""
+独立抢票进程：抢票窗口内不和插件宿主共享事件循环与 GIL。
+
+宿主通过 run_booking_in_worker() 以 `python -m src.worker <config>` 启动子进程，
+子进程的 stdout 专用于 IPC，每行一条 JSON 消息:
+  {"type": "ready"}                    子进程已启动并读到配置，由子进程接管本轮抢票
+  {"type": "notify", "text": "..."}    需要转发给管理员的进度/结果
+  {"type": "log", "level": 20, "text": "..."}
+  {"type": "stats", "data": {...}}     本轮埋点
+  {"type": "done"}
+"""
+import asyncio
+import gc
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 子进程启动+读取配置的最长等待时间，超时视为启动失败，由宿主回退到进程内模式
+# (ready 在 Cookie 检查/自动续期之前发出，这里只覆盖解释器启动和导入)
+READY_TIMEOUT = 30
+# 赛前检查 (预热 + Cookie 检查，失效时 headless 续期最多约 15s 落地 + 60s 等待) 的预留时间，
+# 宿主的整轮超时应在抢票时长之外加上这一段
+PRECHECK_TIMEOUT = 120
+
+
+class _IpcLogHandler(logging.Handler):
+  """把子进程日志转发给宿主"""
+
+  def __init__(self, send):
+    super().__init__()
+    self.send = send
+
+  def emit(self, record):
+    try:
+      self.send({"type": "log", "level": record.levelno, "name": record.name, "text": record.getMessage()})
+    except Exception:
+      pass
+
+
+def _install_fast_loop():
+  """有 uvloop 就用 uvloop，否则用默认事件循环"""
+  try:
+    import uvloop
+  except ImportError:
+    return "asyncio"
+  asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+  return "uvloop"
+
+
+async def _worker(config_path, send):
+  from .booker import VenueBooker
+
+  booker = VenueBooker(config_path)
+  # 读到配置即通知宿主已接管；之后的 Cookie 检查可能要启动浏览器续期，不能算在启动超时里，
+  # 否则宿主超时回退时会和这里的浏览器抢同一个 Profile
+  await asyncio.to_thread(lambda: booker.config)
+  send({"type": "ready"})
+
+  async def notify(text):
+    send({"type": "notify", "text": text})
+
+  # 赛前检查在这里做一次，抢票循环内不再重复
+  await notify("⏳ 正在进行赛前最终检查...")
+  success, msg = await asyncio.to_thread(booker.precheck)
+  if not success:
+    await notify(f"⛔ **任务终止**: {msg}")
+    return
+
+  # 抢票窗口内冻结并关闭 GC，避免分代回收在发请求时造成停顿；进程结束即释放
+  gc.collect()
+  gc.freeze()
+  gc.disable()
+  try:
+    await booker.run_booking_cycle(notify, precheck=False)
+  finally:
+    gc.enable()
+    gc.unfreeze()
+    send({"type": "stats", "data": booker.get_stats()})
+
+
+def main(argv=None):
+  argv = sys.argv[1:] if argv is None else argv
+  config_path = argv[0]
+
+  # stdout 只留给 IPC，其它输出一律走 stderr
+  ipc = os.fdopen(os.dup(sys.stdout.fileno()), "w", encoding="utf-8", buffering=1)
+  sys.stdout = sys.stderr
+
+  # 日志可能来自 to_thread / 对冲线程池，整行写入要加锁，否则交错的行不是合法 JSON 会被宿主丢弃
+  ipc_lock = threading.Lock()
+
+  def send(msg):
+    line = json.dumps(msg, ensure_ascii=False) + "\n"
+    with ipc_lock:
+      ipc.write(line)
+
+  root = logging.getLogger()
+  root.setLevel(logging.INFO)
+  root.addHandler(_IpcLogHandler(send))
+
+  loop_name = _install_fast_loop()
+  logger.info(f"抢票子进程已启动 (pid={os.getpid()}, loop={loop_name})")
+  try:
+    asyncio.run(_worker(config_path, send))
+  except Exception as e:
+    logger.exception(f"抢票子进程异常: {e}")
+  finally:
+    send({"type": "done"})
+    ipc.close()
+
+
+def _kill_tree(proc):
+  """结束子进程及其进程组 (POSIX)；其它平台只能结束子进程本身"""
+  if os.name == "posix":
+    try:
+      os.killpg(proc.pid, signal.SIGKILL)
+      return
+    except ProcessLookupError:
+      return
+    except OSError:
+      pass
+  proc.kill()
+
+
+async def run_booking_in_worker(config_path, send_notify, timeout=None):
+  """
+  在独立进程中执行抢票，进度通过 send_notify 转发。
+  :param timeout: 整轮最长秒数，超时强制结束子进程
+  :return: False 表示子进程未能进入就绪状态 (调用方应回退到进程内抢票)；True 表示已由子进程接管
+  """
+  try:
+    proc = await asyncio.create_subprocess_exec(
+      sys.executable, "-m", "src.worker", config_path,
+      cwd=PLUGIN_DIR,
+      stdin=asyncio.subprocess.DEVNULL,
+      stdout=asyncio.subprocess.PIPE,
+      # JSON 行可能较长 (埋点数据)
+      limit=1024 * 1024,
+      # 独立进程组：超时时连同子进程启动的 chromedriver/Chrome 一起结束，不留下占用 Profile 的浏览器
+      start_new_session=(os.name == "posix"),
+    )
+  except OSError as e:
+    logger.error(f"无法启动抢票子进程: {e}")
+    return False
+
+  ready = False
+  loop = asyncio.get_running_loop()
+  deadline = loop.time() + timeout if timeout else None
+  ready_deadline = loop.time() + READY_TIMEOUT
+  try:
+    while True:
+      limits = [d for d in (deadline, None if ready else ready_deadline) if d is not None]
+      wait = max(min(limits) - loop.time(), 0) if limits else None
+      try:
+        line = await asyncio.wait_for(proc.stdout.readline(), timeout=wait)
+      except asyncio.TimeoutError:
+        logger.error("抢票子进程" + ("超时" if ready else "启动超时"))
+        break
+      if not line:
+        break
+      try:
+        msg = json.loads(line)
+      except json.JSONDecodeError:
+        continue
+
+      kind = msg.get("type")
+      if kind == "ready":
+        ready = True
+      elif kind == "notify":
+        ready = True
+        await send_notify(msg["text"])
+      elif kind == "log":
+        logging.getLogger(msg.get("name", __name__)).log(msg.get("level", logging.INFO), f"[worker] {msg['text']}")
+      elif kind == "stats":
+        logger.info(f"抢票子进程埋点: {msg['data']}")
+      elif kind == "done":
+        break
+  finally:
+    if proc.returncode is None:
+      try:
+        await asyncio.wait_for(proc.wait(), timeout=5)
+      except asyncio.TimeoutError:
+        _kill_tree(proc)
+        await proc.wait()
+
+  return ready
+
+
+if __name__ == "__main__":
+  main()